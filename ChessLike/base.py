@@ -1,6 +1,88 @@
 from functools import total_ordering
 
+# A move packs into an int as
+#   bit      0  promote
+#   bit      1  drop
+#   bit      2  capture
+#   bits   3-6  piece type (numbered by each game)
+#   bit      7  piece color is the second player's
+# followed by the start square, or the piece id (hand slot) of a drop, and
+# then the end square. A square is numbered y*columns + x and takes
+# squareBits(size) bits, so the width of a code depends on the board size.
+CODE_PROMOTE = 1 << 0
+CODE_DROP    = 1 << 1
+CODE_CAPTURE = 1 << 2
+CODE_TYPE_SHIFT = 3
+CODE_SECOND  = 1 << 7
+CODE_SQUARE_SHIFT = 8
+# The bits compared by Move.__eq__
+CODE_KEY_MASK = ~(CODE_PROMOTE | CODE_CAPTURE)
+
+def squareBits(size):
+    rowNum, colNum = size
+    return max((rowNum*colNum-1).bit_length(), 1)
+
+def codeBytes(size):
+    """
+        The number of bytes a move code of a board of size fits in.
+    """
+    return (CODE_SQUARE_SHIFT + 2*squareBits(size) + 7) // 8
+
+def packSquare(pos, size):
+    return pos[1]*size[1] + pos[0]
+
+def unpackSquare(square, size):
+    return (square % size[1], square // size[1])
+
+def packMove(start, end, pieceId, second, size, capture=False, promote=False, drop=False):
+    bits = squareBits(size)
+    squares = (start if drop else packSquare(start, size)) | packSquare(end, size) << bits
+    code = squares << CODE_SQUARE_SHIFT | pieceId << CODE_TYPE_SHIFT
+    if second:
+        code |= CODE_SECOND
+    if capture:
+        code |= CODE_CAPTURE
+    if promote:
+        code |= CODE_PROMOTE
+    if drop:
+        code |= CODE_DROP
+    return code
+
+def unpackMove(code, size):
+    """
+        (start, end, pieceId, second, capture, promote, drop) of a move code.
+    """
+    bits = squareBits(size)
+    mask = (1 << bits) - 1
+    squares = code >> CODE_SQUARE_SHIFT
+    drop = bool(code & CODE_DROP)
+    start = squares & mask
+    if not drop:
+        start = unpackSquare(start, size)
+    return (start, unpackSquare(squares >> bits & mask, size), code >> CODE_TYPE_SHIFT & 15,
+            bool(code & CODE_SECOND), bool(code & CODE_CAPTURE),
+            bool(code & CODE_PROMOTE), drop)
+
+def _sharedPiece(pieceType, args, kargs):
+    return pieceType(*args, **kargs)
+
 class Piece():
+    """
+        Pieces are immutable flyweights: constructing a piece with the same 
+        arguments again returns the same object.
+    """
+    __slots__ = ("symbol", "name", "color", "_legalMoves", "_args")
+    _instances = {}
+
+    def __new__(cls, *args, **kargs):
+        key = (cls, args, tuple(sorted(kargs.items())))
+        piece = Piece._instances.get(key)
+        if piece is None:
+            piece = object.__new__(cls)
+            piece._args = (args, kargs)
+            Piece._instances[key] = piece
+        return piece
+
     def __init__(self, color, symbol, name, legalMoves=None):
         self.symbol = symbol
         self.name = name
@@ -8,6 +90,16 @@ class Piece():
 
         self._legalMoves = legalMoves
 
+    def __reduce__(self):
+        args, kargs = self._args
+        return (_sharedPiece, (type(self), args, kargs))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __repr__(self):
         pieceType = self.name
         return "{}({})".format(pieceType,self.color)
@@ -37,8 +129,13 @@ class Piece():
         return ( self.name == that.name
             and  self.color == that.color )
 
+    def __hash__(self):
+        return hash((self.name, self.color))
+
 @total_ordering
 class Move():
+    __slots__ = ("piece", "start", "end")
+
     def __init__(self, piece, start, end):
         self.piece = piece
         self.start = start
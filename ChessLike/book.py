@@ -0,0 +1,193 @@
+"""
+    Opening books built from played games.
+
+    A book file is an mmaptable of (position hash, (move code, games,
+    points)) records, points being twice the wins plus the draws of the
+    side that played the move. Lookups bisect the memory-mapped file, so a
+    book costs no search time and is shared by all processes reading it.
+
+    python -m ChessLike.book build kyoto kyoto.book --games 2000 --plies 12
+    python -m ChessLike.book show kyoto.book "pgkst/5/5/5/TSKGP w -"
+"""
+import argparse
+import random
+
+from . import player
+from .mmaptable import MappedTable, writeTable
+from .records import GameRecord, readRecords
+from .variants import makeGame
+
+VALUE_FORMAT = "<III"
+
+class BookBuilder():
+    """
+        Collects move statistics of the first maxPlies plies of games.
+    """
+    def __init__(self, maxPlies=12):
+        self.maxPlies = maxPlies
+        self.stats = {}
+
+    def addGame(self, game, moves, winner):
+        """
+            Add the moves played from game (left unchanged) in a game won
+            by winner (None for a draw).
+        """
+        game = game.copy()
+        for move in moves[:self.maxPlies]:
+            if winner is None:
+                points = 1
+            else:
+                points = 2 if winner == game.currentColor else 0
+            entry = self.stats.setdefault((game.hash(), game.encodeMove(move)), [0, 0])
+            entry[0] += 1
+            entry[1] += points
+            game.push(move)
+
+    def addRecord(self, record):
+        game = record.newGame()
+        self.addGame(game, list(record.moves()), record.winner(game))
+
+    def addRecordFile(self, path):
+        for record in readRecords(path):
+            self.addRecord(record)
+
+    def playGames(self, variant, white, black, games, maxPlies=200, seed=0):
+        """
+            Play games between the players white and black (see
+            tournament.playGame) and add them.
+        """
+        from .tournament import playGame
+        for index in range(games):
+            result = playGame(variant, white, black, seed+index, maxPlies, index)
+            self.addRecord(GameRecord.fromNotation(variant, result.moves, result.winner))
+
+    def write(self, path, minGames=1):
+        """
+            Write the moves played at least minGames times to path and return
+            the number of records.
+        """
+        records = [(key, (code, games, points))
+                   for (key, code), (games, points) in self.stats.items()
+                   if games >= minGames]
+        return writeTable(path, records, VALUE_FORMAT, {"maxPlies": self.maxPlies})
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.table = MappedTable(path)
+
+    def entries(self, game):
+        """
+            (move, games, points) of the book moves of game that are legal,
+            most played first.
+        """
+        records = self.table.getAll(game.hash())
+        if not records:
+            return []
+        legal = set(game.legalMoveCodes())
+        entries = [(game.decodeMove(code), games, points)
+                   for code, games, points in records if code in legal]
+        entries.sort(key=lambda entry: -entry[1])
+        return entries
+
+    def choose(self, game, best=False):
+        """
+            A book move of game picked at random in proportion to the games
+            it was played in, or the one with the best score if best is set;
+            None when the position is not in the book.
+        """
+        entries = self.entries(game)
+        if not entries:
+            return None
+        if best:
+            return max(entries, key=lambda entry: (entry[2]/entry[1], entry[1]))[0]
+        return random.choices([entry[0] for entry in entries],
+                              weights=[entry[1] for entry in entries])[0]
+
+    def close(self):
+        self.table.close()
+
+class BookPlayer():
+    """
+        Player that plays from the book at path and calls fallback(game)
+        outside it. It pickles as its path, so every process of a
+        tournament maps the same file.
+    """
+    def __init__(self, path, fallback=player.minOpponents, best=False):
+        self.path = path
+        self.fallback = fallback
+        self.best = best
+        self.book = OpeningBook(path)
+
+    def __call__(self, game):
+        move = self.book.choose(game, self.best)
+        if move is None:
+            return self.fallback(game)
+        return move
+
+    def __getstate__(self):
+        return (self.path, self.fallback, self.best)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+BOOKS = []
+
+def loadBook(path):
+    BOOKS.append(OpeningBook(path))
+
+def bookMove(game):
+    """
+        Player using the books loaded with loadBook, in order, and
+        minOpponents outside them.
+    """
+    for book in BOOKS:
+        move = book.choose(game)
+        if not (move is None):
+            return move
+    return player.minOpponents(game)
+
+def main(argv=None):
+    from .tournament import PLAYERS
+    parser = argparse.ArgumentParser(prog="python -m ChessLike.book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from games")
+    build.add_argument("variant")
+    build.add_argument("path")
+    build.add_argument("--games", type=int, default=1000,
+                       help="number of self-play games")
+    build.add_argument("--player", default="minOpponents", choices=sorted(PLAYERS))
+    build.add_argument("--records", nargs="*", default=[],
+                       help="record files to add instead of or besides self-play")
+    build.add_argument("--plies", type=int, default=12)
+    build.add_argument("--min-games", type=int, default=2)
+    build.add_argument("--seed", type=int, default=0)
+    show = commands.add_parser("show", help="list the book moves of a position")
+    show.add_argument("path")
+    show.add_argument("fen", nargs="?", default=None)
+    show.add_argument("--variant", default="kyoto")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        builder = BookBuilder(args.plies)
+        for path in args.records:
+            builder.addRecordFile(path)
+        if args.games:
+            playerFunction = PLAYERS[args.player]
+            builder.playGames(args.variant, playerFunction, playerFunction,
+                              args.games, seed=args.seed)
+        count = builder.write(args.path, args.min_games)
+        print("{} moves from {} positions".format(
+                count, len({key for key, code in builder.stats})))
+        return 0
+
+    game = makeGame(args.variant)
+    if not (args.fen is None):
+        game = type(game).fromFEN(args.fen)
+    book = OpeningBook(args.path)
+    for move, games, points in book.entries(game):
+        print("{:10s} {:8d} games  score {:.3f}".format(str(move), games, points/(2*games)))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
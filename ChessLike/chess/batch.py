@@ -0,0 +1,159 @@
+import numpy as np
+
+from .nPawn import nPawnGame, Pawn, Move, WHITE, BLACK
+
+EMPTY = 0
+WHITE_PAWN = 1
+BLACK_PAWN = -1
+
+FORWARD = 0
+CAPTURE_RIGHT = 1
+CAPTURE_LEFT = 2
+MOVE_DX = (0, 1, -1)
+
+class HexapawnBatch():
+    """
+        Many nPawnGame games played in lockstep on one NumPy array.
+
+        boards has shape (games, rows, columns) and holds 1 for a white pawn,
+        -1 for a black pawn and 0 for an empty square; boards[n, y, x] is
+        square (x,y) of game n. All games start together, so the side to
+        move is the same for every game still running.
+
+        A move is an index into the flattened (3, rows, columns) move mask:
+        the kind of move (forward, capture towards +x, capture towards -x)
+        and the square of the moving pawn.
+    """
+    def __init__(self, games, size=4, seed=None):
+        if size is None:
+            size = 4
+
+        if type(size) == int:
+            size = (size,size)
+
+        self.size = size
+        rowNum, colNum = size
+        self.boards = np.zeros((games, rowNum, colNum), dtype=np.int8)
+        self.boards[:, 0, :] = WHITE_PAWN
+        self.boards[:, rowNum-1, :] = BLACK_PAWN
+        self.currentColor = WHITE
+        self.winners = np.zeros(games, dtype=np.int8)
+        self.plies = np.zeros(games, dtype=np.int32)
+        self.rng = np.random.default_rng(seed)
+
+    def legalMoveMask(self, color=None):
+        """
+            Boolean array of shape (games, 3, rows, columns); entry
+            [n, kind, y, x] is set when the pawn on (x,y) of game n may make
+            a move of that kind.
+        """
+        if color is None:
+            color = self.currentColor
+        boards = self.boards
+        sign = WHITE_PAWN if color == WHITE else BLACK_PAWN
+        own = boards == sign
+        enemy = boards == -sign
+        empty = boards == EMPTY
+
+        mask = np.zeros((len(boards), 3) + self.size, dtype=bool)
+        if color == WHITE:
+            source, target = slice(None, -1), slice(1, None)
+        else:
+            source, target = slice(1, None), slice(None, -1)
+        mask[:, FORWARD, source, :] = own[:, source, :] & empty[:, target, :]
+        mask[:, CAPTURE_RIGHT, source, :-1] = own[:, source, :-1] & enemy[:, target, 1:]
+        mask[:, CAPTURE_LEFT, source, 1:] = own[:, source, 1:] & enemy[:, target, :-1]
+        return mask
+
+    def active(self):
+        return self.winners == 0
+
+    def randomMoves(self, mask=None):
+        """
+            A uniformly random legal move for every game, -1 where a game
+            has none.
+        """
+        if mask is None:
+            mask = self.legalMoveMask()
+        flat = mask.reshape(len(mask), -1)
+        keys = self.rng.random(flat.shape)
+        keys[~flat] = -1
+        moves = keys.argmax(axis=1)
+        moves[~flat.any(axis=1)] = -1
+        return moves
+
+    def play(self, moves):
+        """
+            Play one move in every running game and update winners the way
+            nPawnGame.winner decides them. Games without a legal move lose.
+        """
+        rowNum, colNum = self.size
+        color = self.currentColor
+        sign = WHITE_PAWN if color == WHITE else BLACK_PAWN
+        direction = 1 if color == WHITE else -1
+
+        running = self.active()
+        stuck = running & (moves < 0)
+        self.winners[stuck] = -sign
+
+        games = np.nonzero(running & (moves >= 0))[0]
+        kind, rest = np.divmod(moves[games], rowNum*colNum)
+        y, x = np.divmod(rest, colNum)
+        yy = y + direction
+        xx = x + np.take(MOVE_DX, kind)
+        self.boards[games, y, x] = EMPTY
+        self.boards[games, yy, xx] = sign
+        self.plies[games] += 1
+
+        lastRank = rowNum-1 if color == WHITE else 0
+        reached = np.zeros(len(self.boards), dtype=bool)
+        reached[games] = (self.boards[games, lastRank, :] == sign).any(axis=1)
+        self.winners[reached] = sign
+
+        self.currentColor = BLACK if color == WHITE else WHITE
+        mask = self.legalMoveMask()
+        blocked = self.active() & ~mask.reshape(len(mask), -1).any(axis=1)
+        self.winners[blocked] = sign
+        return mask
+
+    def playRandom(self, maxPlies=None):
+        """
+            Play random moves until every game is decided (or maxPlies plies
+            were made) and return the winners array: 1 for white, -1 for
+            black, 0 for undecided.
+        """
+        rowNum, colNum = self.size
+        if maxPlies is None:
+            maxPlies = 2*rowNum*colNum
+        mask = self.legalMoveMask()
+        for ply in range(maxPlies):
+            if not self.active().any():
+                break
+            mask = self.play(self.randomMoves(mask))
+        return self.winners
+
+    def decodeMove(self, move, color=None):
+        if color is None:
+            color = self.currentColor
+        rowNum, colNum = self.size
+        kind, rest = divmod(int(move), rowNum*colNum)
+        y, x = divmod(rest, colNum)
+        direction = 1 if color == WHITE else -1
+        symbol = "P" if color == WHITE else "p"
+        return Move(Pawn(color, symbol, "Pawn"), (x,y), (x+MOVE_DX[kind], y+direction),
+                    capture=(kind != FORWARD))
+
+    def toGame(self, index):
+        """
+            Game index as an nPawnGame.
+        """
+        game = nPawnGame(self.size)
+        game.board = {}
+        game.currentColor = self.currentColor
+        for y, x in zip(*np.nonzero(self.boards[index])):
+            if self.boards[index, y, x] == WHITE_PAWN:
+                game.board[(int(x),int(y))] = Pawn(WHITE, "P", "Pawn")
+            else:
+                game.board[(int(x),int(y))] = Pawn(BLACK, "p", "Pawn")
+        game.refresh()
+        return game
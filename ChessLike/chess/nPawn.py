@@ -1,36 +1,67 @@
 import copy
 from ..base import Piece
 from ..base import Move as BaseMove
+from ..base import packMove, unpackMove, squareBits, CODE_KEY_MASK, CODE_SQUARE_SHIFT
+from ..movement import PieceMovement, moveTable, destinations
+from ..zobrist import ZOBRIST
 
 WHITE = "white"
 BLACK = "black"
 
 class Pawn(Piece):
+    __slots__ = ()
+
     def legalMoves(self, pos, game, *args, **kargs):
         color = self.color
-        x, y = pos
-        board = game.board
-        direction = 1 if color == WHITE else -1
+        entry = moveTable(PAWN_MOVEMENT, game.size, FORWARD[color])[pos]
 
         moves = []
-        if ( (x+1,y+direction) in board and 
-                self.noConflict((x+1, y+direction), game, color) ):
-            moves.append(Move(self,pos, (x+1,y+direction), capture=True))
-
-        if ( (x-1,y+direction) in board and 
-                self.noConflict((x-1, y+direction), game, color) ):
-            moves.append(Move(self,pos, (x-1,y+direction), capture=True))
+        for end, capture in destinations(entry, game.board, color):
+            moves.append(Move(self,pos, end, capture=capture))
+        return moves
 
-        if ( (x,y+direction) not in board and 
-                game.isInBounds((x,y+direction)) ): 
-            moves.append(Move(self,pos,(x,y+direction)))
+PAWN_MOVEMENT = PieceMovement(captures=[(1,1),(-1,1)], advances=[(0,1)])
 
-        return moves
+# Pawns of each color move toward this side of the board
+FORWARD = {WHITE: 1, BLACK: -1}
 
 PIECE_UNICODE = {WHITE: {Pawn: "♙"},
                  BLACK: {Pawn: "♟"}}
 
+PIECE_SYMBOL = {WHITE: "P", BLACK: "p"}
+
+FEN_PIECES = {"P": Pawn(WHITE, "P", "Pawn"), "p": Pawn(BLACK, "p", "Pawn")}
+FEN_COLOR = {WHITE: "w", BLACK: "b"}
+FEN_COLOR_NAME = {"w": WHITE, "b": BLACK}
+_fenRanks = {}
+_fenTemplates = {}
+
+def fenRank(rank):
+    """
+        The number of squares of a rank of a FEN board and the (x, piece) 
+        pairs on it. Ranks are cached since few distinct ones occur.
+    """
+    parsed = _fenRanks.get(rank)
+    if parsed is None:
+        pieces = []
+        x = 0
+        empty = 0
+        for char in rank:
+            if char.isdigit():
+                empty = empty*10 + int(char)
+                continue
+            if char not in FEN_PIECES:
+                raise ValueError("Invalid FEN rank: {}".format(rank))
+            x += empty
+            empty = 0
+            pieces.append((x, FEN_PIECES[char]))
+            x += 1
+        parsed = _fenRanks[rank] = (x + empty, tuple(pieces))
+    return parsed
+
 class Move(BaseMove):
+    __slots__ = ("capture",)
+
     def __init__(self, piece, start, end, capture=False):
         self.piece = piece
         self.start = start
@@ -54,6 +85,109 @@ class Move(BaseMove):
     def __str__(self):
         return self.longAlgebraicNotation()
 
+def decodeMove(code, size):
+    start, end, pieceId, second, capture, promote, drop = unpackMove(code, size)
+    color = BLACK if second else WHITE
+    return Move(Pawn(color, PIECE_SYMBOL[color], "Pawn"), start, end, capture=capture)
+
+# Symmetries of nPawnGame, combined as bit flags: MIRROR reflects the 
+# board left to right, FLIP swaps the colors (side to move included) and 
+# turns the board upside down. Every combination is its own inverse.
+IDENTITY = 0
+MIRROR = 1
+FLIP = 2
+TRANSFORMS = (IDENTITY, MIRROR, FLIP, MIRROR | FLIP)
+
+def transformSquare(pos, transform, size):
+    rowNum, colNum = size
+    x, y = pos
+    if transform & MIRROR:
+        x = colNum-1-x
+    if transform & FLIP:
+        y = rowNum-1-y
+    return (x, y)
+
+def transformMove(move, transform, size):
+    """
+        The move that corresponds to move in the transformed position; 
+        applying the same transform again maps it back.
+    """
+    piece = move.piece
+    if transform & FLIP:
+        color = BLACK if piece.color == WHITE else WHITE
+        piece = Pawn(color, PIECE_SYMBOL[color], "Pawn")
+    return Move(piece, transformSquare(move.start, transform, size),
+                transformSquare(move.end, transform, size), capture=move.capture)
+
+class BoardSymmetry():
+    """
+        Symmetries on the integer position keys used by HexapawnSolver:
+        ((white << squares | black) << 1) | blackToMove, where square x+cols*y 
+        is bit x+cols*y of the white and black pawn masks.
+
+        Every transform permutes the key bits (and FLIP toggles the side to 
+        move bit), so it is applied with one lookup table per key byte.
+    """
+    def __init__(self, size):
+        self.size = rowNum, colNum = size
+        self.squareNum = squareNum = rowNum*colNum
+        keyBits = 2*squareNum + 1
+
+        self.tables = {}
+        for transform in TRANSFORMS[1:]:
+            # target[bit] is where key bit bit goes; bit 0, the side to
+            # move, is handled separately
+            target = [0]
+            for offset in [1, squareNum+1]:
+                for square in range(squareNum):
+                    x, y = transformSquare((square % colNum, square // colNum), transform, size)
+                    color = offset
+                    if transform & FLIP:
+                        color = squareNum+1 if offset == 1 else 1
+                    target.append(color + x + colNum*y)
+            chunks = []
+            for shift in range(0, keyBits, 8):
+                table = []
+                for byte in range(256):
+                    bits = 0
+                    for bit in range(8):
+                        if byte >> bit & 1 and 0 < shift+bit < keyBits:
+                            bits |= 1 << target[shift+bit]
+                    table.append(bits)
+                chunks.append((shift, table))
+            self.tables[transform] = (1 if transform & FLIP else 0, chunks)
+
+    def encode(self, white, black, blackToMove):
+        return (((white << self.squareNum) | black) << 1) | bool(blackToMove)
+
+    def transform(self, key, transform):
+        if transform == IDENTITY:
+            return key
+        result, chunks = self.tables[transform]
+        result ^= key & 1
+        for shift, table in chunks:
+            result |= table[key >> shift & 255]
+        return result
+
+    def canonical(self, key):
+        """
+            The smallest key of the symmetry class of key, and the transform 
+            that maps key to it.
+        """
+        best, bestTransform = key, IDENTITY
+        for transform in TRANSFORMS[1:]:
+            other = self.transform(key, transform)
+            if other < best:
+                best, bestTransform = other, transform
+        return best, bestTransform
+
+SYMMETRIES = {}
+
+def symmetryFor(size):
+    if size not in SYMMETRIES:
+        SYMMETRIES[size] = BoardSymmetry(size)
+    return SYMMETRIES[size]
+
 class nPawnGame():
     """
         The coordinate is as follows: 
@@ -72,6 +206,9 @@ class nPawnGame():
         self.size = size
         self.currentColor = WHITE
         self.board = {}
+        self.history = []
+        self._hash = None
+        self._statsBoard = None
 
         rowNum, colNum = self.size
         for col in range(colNum): 
@@ -110,6 +247,156 @@ class nPawnGame():
                 if row != 0:
                     print("-+"*colNum+"-")
 
+    def hash(self):
+        """
+            64-bit Zobrist key of the position, kept up to date by push/pop. 
+            Call refresh() after editing board or currentColor directly.
+        """
+        if self._hash is None:
+            key = ZOBRIST[("side", self.currentColor)]
+            for pos in self.board:
+                key ^= ZOBRIST[(pos, str(self.board[pos]))]
+            self._hash = key
+        return self._hash
+
+    def refresh(self):
+        self._hash = None
+        self._statsBoard = None
+
+    def pawnStats(self):
+        """
+            Per color pawn counts, most advanced ranks (None without pawns) 
+            and numbers of legal moves. They are built on first use and then 
+            updated by push/pop; call refresh() after editing board directly.
+        """
+        if self._statsBoard is not self.board:
+            rowNum = self.size[0]
+            self._statsBoard = self.board
+            self._counts = {WHITE: 0, BLACK: 0}
+            self._ranks = {WHITE: [0]*rowNum, BLACK: [0]*rowNum}
+            self._mobility = {WHITE: 0, BLACK: 0}
+            for pos, piece in self.board.items():
+                self._counts[piece.color] += 1
+                self._ranks[piece.color][pos[1]] += 1
+                self._mobility[piece.color] += self.pawnMobility(pos, piece.color)
+            self._advanced = {color: self._scanAdvanced(color) for color in [WHITE, BLACK]}
+        return self._counts, self._advanced, self._mobility
+
+    def pawnCount(self, color):
+        return self.pawnStats()[0][color]
+
+    def advancedRank(self, color):
+        return self.pawnStats()[1][color]
+
+    def mobility(self, color=None):
+        if color is None:
+            color = self.currentColor
+        return self.pawnStats()[2][color]
+
+    def _scanAdvanced(self, color):
+        ranks = self._ranks[color]
+        order = range(len(ranks)-1, -1, -1) if color == WHITE else range(len(ranks))
+        for y in order:
+            if ranks[y]:
+                return y
+        return None
+
+    def positionKey(self):
+        """
+            The position as an integer (see BoardSymmetry).
+        """
+        colNum = self.size[1]
+        white = black = 0
+        for (x, y), piece in self.board.items():
+            if piece.color == WHITE:
+                white |= 1 << (x + colNum*y)
+            else:
+                black |= 1 << (x + colNum*y)
+        return symmetryFor(self.size).encode(white, black, self.currentColor == BLACK)
+
+    def canonical(self):
+        """
+            (key, transform): the positionKey shared by all positions 
+            symmetric to this one, and the transform taking this position 
+            to the one with that key. transformMove(move, transform, size) 
+            maps moves between the two in both directions.
+        """
+        return symmetryFor(self.size).canonical(self.positionKey())
+
+    def toFEN(self):
+        """
+            FEN-like text of the position: the ranks from row rowNum-1 down 
+            to 0 with runs of empty squares as numbers, and the side to move. 
+            E.g. the initial 3x3 position is "ppp/3/PPP w".
+        """
+        rowNum, colNum = self.size
+        ranks = []
+        for y in range(rowNum-1, -1, -1):
+            rank = ""
+            empty = 0
+            for x in range(colNum):
+                piece = self.board.get((x,y))
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += str(piece)
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        return "{} {}".format("/".join(ranks), FEN_COLOR[self.currentColor])
+
+    @classmethod
+    def fromFEN(cls, fen):
+        """
+            The position of a toFEN() string, with an empty history. The 
+            board size is taken from the FEN.
+        """
+        fields = fen.split()
+        if len(fields) != 2 or fields[1] not in FEN_COLOR_NAME:
+            raise ValueError("Invalid FEN: {}".format(fen))
+        ranks = fields[0].split("/")
+        rowNum = len(ranks)
+
+        board = {}
+        colNum = None
+        for index, rank in enumerate(ranks):
+            width, pieces = fenRank(rank)
+            if colNum is None:
+                colNum = width
+            elif width != colNum:
+                raise ValueError("FEN ranks of different width: {}".format(fields[0]))
+            y = rowNum-1-index
+            for x, piece in pieces:
+                board[(x,y)] = piece
+
+        template = _fenTemplates.get(cls)
+        if template is None:
+            template = _fenTemplates[cls] = cls()
+        # Cheaper than copy.copy(template)
+        game = cls.__new__(cls)
+        game.__dict__.update(template.__dict__)
+        game.size = (rowNum, colNum)
+        game.currentColor = FEN_COLOR_NAME[fields[1]]
+        game.board = board
+        game.history = []
+        game.refresh()
+        return game
+
+    def __hash__(self):
+        return self.hash()
+
+    def __eq__(self, that):
+        if not isinstance(that, nPawnGame):
+            return NotImplemented
+        return ( self.hash() == that.hash()
+            and  self.size == that.size
+            and  self.currentColor == that.currentColor
+            and  {pos: piece.color for pos, piece in self.board.items()} ==
+                 {pos: piece.color for pos, piece in that.board.items()} )
+
     def isInBounds(self, pos):
         x, y = pos
         rowNum, colNum = self.size
@@ -127,8 +414,182 @@ class nPawnGame():
                 moves += piece.legalMoves(pos, self)
         return moves
 
+    def iterLegalMoves(self, color=None, captures=False):
+        """
+            Generate the legal moves one at a time, in the order of 
+            legalMoves; with captures set only captures. Moves may be pushed 
+            and popped while iterating.
+        """
+        if color is None:
+            color = self.currentColor
+
+        for pos, piece in list(self.board.items()):
+            if piece.color == color:
+                for move in piece.legalMoves(pos, self):
+                    if not captures or move.capture:
+                        yield move
+
+    def hasLegalMove(self, color=None):
+        if color is None:
+            color = self.currentColor
+        if self._statsBoard is self.board:
+            return self._mobility[color] > 0
+        rowNum, colNum = self.size
+        board = self.board
+        direction = 1 if color == WHITE else -1
+
+        for (x, y), piece in board.items():
+            if piece.color != color:
+                continue
+            yy = y+direction
+            if not (0 <= yy < rowNum):
+                continue
+            if (x,yy) not in board:
+                return True
+            for xx in (x-1, x+1):
+                target = board.get((xx,yy))
+                if not (target is None) and target.color != color:
+                    return True
+        return False
+
+    def iterAttacks(self, color=None):
+        """
+            Generate (square, target) for every square on the board a pawn of 
+            color attacks, whether it is occupied or not.
+        """
+        if color is None:
+            color = self.currentColor
+        rowNum, colNum = self.size
+        direction = 1 if color == WHITE else -1
+
+        for (x, y), piece in list(self.board.items()):
+            if piece.color == color and 0 <= y+direction < rowNum:
+                for xx in (x-1, x+1):
+                    if 0 <= xx < colNum:
+                        yield (x,y), (xx,y+direction)
+
+    def legalMoveCodes(self, color=None):
+        """
+            The legal moves as packed ints (see base.packMove), generated 
+            without creating Move objects.
+        """
+        if color is None:
+            color = self.currentColor
+        board = self.board
+        rowNum, colNum = self.size
+        direction = 1 if color == WHITE else -1
+        colorBits = packMove((0,0), (0,0), 0, color == BLACK, self.size)
+        captureBits = packMove((0,0), (0,0), 0, color == BLACK, self.size, capture=True)
+        endShift = CODE_SQUARE_SHIFT + squareBits(self.size)
+
+        codes = []
+        for pos in board:
+            if board[pos].color != color:
+                continue
+            x, y = pos
+            yy = y + direction
+            if not (0 <= yy < rowNum):
+                continue
+            start = (y*colNum + x) << CODE_SQUARE_SHIFT
+            rank = yy*colNum
+            for xx in (x+1, x-1):
+                target = board.get((xx,yy))
+                if not (target is None) and target.color != color:
+                    codes.append(captureBits | start | (rank+xx) << endShift)
+            if (x,yy) not in board:
+                codes.append(colorBits | start | (rank+x) << endShift)
+        return codes
+
+    def pawnMobility(self, pos, color, changed=None):
+        """
+            The number of moves of a pawn of color on pos, with the squares
+            of changed (a dict from square to piece or None) replacing those
+            of the board.
+        """
+        board = self.board
+        x, y = pos
+        yy = y + (1 if color == WHITE else -1)
+        if not (0 <= yy < self.size[0]):
+            return 0
+
+        count = 0
+        for xx in (x-1, x, x+1):
+            end = (xx,yy)
+            target = changed[end] if not (changed is None) and end in changed else board.get(end)
+            if xx == x:
+                if target is None:
+                    count += 1
+            elif not (target is None) and target.color != color:
+                count += 1
+        return count
+
+    def mobilityDelta(self, move):
+        """
+            How much move changes the number of legal moves of the opponent
+            of the side making it, found without playing it.
+        """
+        other = self.otherColor(self.board[move.start].color)
+        return self._mobilityDeltas(move)[other]
+
+    def _mobilityDeltas(self, move):
+        """
+            The change move makes to the number of legal moves of each 
+            color. Besides the moved and the captured pawn, only the pawns 
+            that can move to its start or end square are affected.
+        """
+        get = self.board.get
+        start, end = move.start, move.end
+        piece = get(start)
+        taken = get(end)
+        color = piece.color
+        other = BLACK if color == WHITE else WHITE
+        direction = 1 if color == WHITE else -1
+
+        own = self.pawnMobility(end, color) - self.pawnMobility(start, color)
+        opponent = 0
+        if not (taken is None):
+            opponent -= self.pawnMobility(end, other)
+
+        # start is emptied: it can be advanced to, but not captured on
+        x, y = start
+        pawn = get((x,y-direction))
+        if not (pawn is None) and pawn.color == color:
+            own += 1
+        pawn = get((x,y+direction))
+        if not (pawn is None) and pawn.color == other:
+            opponent += 1
+        for pos in ((x-1,y+direction), (x+1,y+direction)):
+            pawn = get(pos)
+            if not (pawn is None) and pawn.color == other and pos != end:
+                opponent -= 1
+
+        # end gets the moved pawn
+        x, y = end
+        if taken is None:
+            pawn = get((x,y+direction))
+            if not (pawn is None) and pawn.color == other:
+                opponent -= 1
+        else:
+            for pos in ((x-1,y-direction), (x+1,y-direction)):
+                pawn = get(pos)
+                if not (pawn is None) and pawn.color == color and pos != start:
+                    own -= 1
+        for pos in ((x-1,y+direction), (x+1,y+direction)):
+            pawn = get(pos)
+            if not (pawn is None) and pawn.color == other:
+                opponent += 1
+        return {color: own, other: opponent}
+
+    def encodeMove(self, move):
+        return packMove(move.start, move.end, 0, move.piece.color == BLACK, self.size,
+                        capture=move.capture)
+
+    def decodeMove(self, code):
+        return decodeMove(code, self.size)
+
     def isValid(self, move):
-        return move in self.legalMoves()
+        key = self.encodeMove(move) & CODE_KEY_MASK
+        return key in {code & CODE_KEY_MASK for code in self.legalMoveCodes()}
 
     def otherColor(self,color=None):
         if color == WHITE:
@@ -141,38 +602,118 @@ class nPawnGame():
         if not self.isValid(move):
             return False
 
+        self.push(move)
+        return True
+
+    def push(self, move):
+        """
+            Play a move in place without validating it. The captured piece 
+            is kept on the undo stack so that pop() can restore the position.
+        """
         start = move.start 
         end = move.end
+        stats = self._statsBoard is self.board
+        if stats:
+            delta = self._mobilityDeltas(move)
 
         piece = self.board.pop(start)
+        taken = self.board.get(end)
         self.board[end] = piece
+        self.history.append((move, taken))
 
         self.currentColor = self.otherColor(self.currentColor)
+        if not (self._hash is None):
+            self._hash ^= self._hashDelta(move, piece, taken)
+        if stats:
+            for color in [WHITE, BLACK]:
+                self._mobility[color] += delta[color]
+            color = piece.color
+            self._ranks[color][start[1]] -= 1
+            self._ranks[color][end[1]] += 1
+            if self._advanced[color] == start[1]:
+                self._advanced[color] = end[1]
+            if not (taken is None):
+                color = taken.color
+                self._counts[color] -= 1
+                self._ranks[color][end[1]] -= 1
+                if self._advanced[color] == end[1] and not self._ranks[color][end[1]]:
+                    self._advanced[color] = self._scanAdvanced(color)
+
+    def pop(self):
+        """
+            Undo the last pushed move and return it.
+        """
+        move, taken = self.history.pop()
+        start = move.start
+        end = move.end
+        piece = self.board.pop(end)
+        self.board[start] = piece
+        if not (taken is None):
+            self.board[end] = taken
 
-        return True
+        self.currentColor = self.otherColor(self.currentColor)
+        if not (self._hash is None):
+            self._hash ^= self._hashDelta(move, piece, taken)
+        if self._statsBoard is self.board:
+            delta = self._mobilityDeltas(move)
+            for color in [WHITE, BLACK]:
+                self._mobility[color] -= delta[color]
+            color = piece.color
+            self._ranks[color][end[1]] -= 1
+            self._ranks[color][start[1]] += 1
+            if self._advanced[color] == end[1] and not self._ranks[color][end[1]]:
+                self._advanced[color] = start[1]
+            if not (taken is None):
+                color = taken.color
+                self._counts[color] += 1
+                self._ranks[color][end[1]] += 1
+                advanced = self._advanced[color]
+                if advanced is None or (end[1] > advanced if color == WHITE else end[1] < advanced):
+                    self._advanced[color] = end[1]
+        return move
+
+    def _hashDelta(self, move, piece, taken):
+        delta = ZOBRIST[("side", WHITE)] ^ ZOBRIST[("side", BLACK)]
+        delta ^= ZOBRIST[(move.start, str(piece))] ^ ZOBRIST[(move.end, str(piece))]
+        if not (taken is None):
+            delta ^= ZOBRIST[(move.end, str(taken))]
+        return delta
+
+    def copy(self):
+        game = copy.copy(self)
+        game.board = dict(self.board)
+        game.history = list(self.history)
+        if self._statsBoard is self.board:
+            game._statsBoard = game.board
+            game._counts = dict(self._counts)
+            game._ranks = {color: list(ranks) for color, ranks in self._ranks.items()}
+            game._advanced = dict(self._advanced)
+            game._mobility = dict(self._mobility)
+        return game
 
     def peek(self, move):
-        game = copy.deepcopy(self)
-        if not game.isValid(move):
+        if not self.isValid(move):
             return None
 
-        game.play(move)
+        game = self.copy()
+        game.push(move)
         return game
 
     def winner(self):
-        rowNum, colNum = self.size
-        for pos in self.board:
-            piece = self.board[pos]
-
-            if piece.color == WHITE and pos[1] == rowNum-1:
-                return WHITE
-            if piece.color == BLACK and pos[1] == 0:
-                return BLACK
+        """
+            O(1) from pawnStats: a pawn on its last rank wins, and a side 
+            without legal moves loses.
+        """
+        counts, advanced, mobility = self.pawnStats()
+        if advanced[WHITE] == self.size[0]-1:
+            return WHITE
+        if advanced[BLACK] == 0:
+            return BLACK
 
-        if not self.legalMoves():
+        if mobility[self.currentColor] == 0:
             return self.otherColor(self.currentColor)
 
         return None
 
     def loser(self):
-        self.otherColor(self.winner())
\ No newline at end of file
+        return self.otherColor(self.winner())
\ No newline at end of file
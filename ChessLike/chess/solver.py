@@ -0,0 +1,267 @@
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+from .nPawn import nPawnGame, symmetryFor, WHITE, BLACK
+
+UNKNOWN = 0xFF
+WIN_FLAG = 0x80
+
+class HexapawnSolver():
+    """
+        Exact solution of nPawnGame for one board size. Keys are 64-bit, so
+        the board may have at most 31 squares (2*31+1 key bits): 5x6 and
+        6x5 fit, 6x6 is rejected.
+
+        Every position reachable from the initial one is enumerated and
+        encoded as an integer key (white pawn bits, black pawn bits, side to
+        move). Only the canonical key of every symmetry class is kept (see
+        BoardSymmetry), which stores about a third of the positions from
+        4x4 up (half of them on 3x3). The keys are stored sorted in an
+        array of uint64, and position i of that array owns byte i of the
+        result table, so a lookup is a binary search (O(log n)) and every
+        position costs 9 bytes. A result byte holds a win flag for the side
+        to move in the top bit and the distance to the end of the game in
+        plies in the low 7 bits.
+
+        The table is filled by retrograde analysis: starting from the
+        positions nPawnGame.winner decides, results are propagated to
+        predecessor positions by un-making moves, one distance at a time.
+    """
+    def __init__(self, size=4):
+        if size is None:
+            size = 4
+
+        if type(size) == int:
+            size = (size,size)
+
+        self.size = size
+        self.symmetry = symmetryFor(size)
+        rowNum, colNum = size
+        self.squareNum = squareNum = rowNum*colNum
+        if 2*squareNum+1 > 64:
+            raise ValueError("Board too large to solve: {}x{}".format(rowNum, colNum))
+
+        self.lastRank = {WHITE: sum(1 << (x+colNum*(rowNum-1)) for x in range(colNum)),
+                         BLACK: sum(1 << x for x in range(colNum))}
+
+        # forward[color][square] and captures[color][square] hold the target
+        # squares of a pawn of that color, as square indices.
+        self.forward = {WHITE: [], BLACK: []}
+        self.captures = {WHITE: [], BLACK: []}
+        for color in [WHITE, BLACK]:
+            direction = 1 if color == WHITE else -1
+            for square in range(squareNum):
+                x, y = square % colNum, square // colNum
+                yy = y + direction
+                if not (0 <= yy < rowNum):
+                    self.forward[color].append(None)
+                    self.captures[color].append(())
+                    continue
+                self.forward[color].append(x + colNum*yy)
+                self.captures[color].append(tuple(xx + colNum*yy
+                        for xx in (x-1, x+1) if 0 <= xx < colNum))
+
+        self.solve()
+
+    def encode(self, white, black, color):
+        return (((white << self.squareNum) | black) << 1) | (color == BLACK)
+
+    def decode(self, key):
+        color = BLACK if key & 1 else WHITE
+        key >>= 1
+        black = key & ((1 << self.squareNum) - 1)
+        white = key >> self.squareNum
+        return white, black, color
+
+    def gameKey(self, game):
+        return game.positionKey()
+
+    def canonical(self, key):
+        return self.symmetry.canonical(key)[0]
+
+    def isDecided(self, white, black):
+        return bool(white & self.lastRank[WHITE] or black & self.lastRank[BLACK])
+
+    def children(self, key):
+        white, black, color = self.decode(key)
+        own, other = (white, black) if color == WHITE else (black, white)
+        occupied = white | black
+        forward = self.forward[color]
+        captures = self.captures[color]
+
+        children = []
+        pawns = own
+        while pawns:
+            low = pawns & -pawns
+            pawns ^= low
+            square = low.bit_length()-1
+
+            targets = []
+            for end in captures[square]:
+                if other >> end & 1:
+                    targets.append(end)
+            end = forward[square]
+            if not (end is None) and not (occupied >> end & 1):
+                targets.append(end)
+
+            for end in targets:
+                endBit = 1 << end
+                movedOwn = own ^ low ^ endBit
+                movedOther = other & ~endBit
+                if color == WHITE:
+                    children.append(self.encode(movedOwn, movedOther, BLACK))
+                else:
+                    children.append(self.encode(movedOther, movedOwn, WHITE))
+        return children
+
+    def parents(self, key):
+        """
+            Keys of all positions, legal or not, from which a single move
+            leads to key.
+        """
+        white, black, color = self.decode(key)
+        mover = self.otherColor(color)
+        own, other = (white, black) if mover == WHITE else (black, white)
+        occupied = white | black
+        backward = self.forward[color]
+        backCaptures = self.captures[color]
+
+        parents = []
+        pawns = own
+        while pawns:
+            low = pawns & -pawns
+            pawns ^= low
+            square = low.bit_length()-1
+
+            start = backward[square]
+            if not (start is None) and not (occupied >> start & 1):
+                parents.append((own ^ low ^ (1 << start), other))
+            for start in backCaptures[square]:
+                if not (occupied >> start & 1):
+                    parents.append((own ^ low ^ (1 << start), other | low))
+
+        if mover == WHITE:
+            return [self.encode(o, t, WHITE) for o, t in parents]
+        return [self.encode(t, o, BLACK) for o, t in parents]
+
+    def otherColor(self, color):
+        return BLACK if color == WHITE else WHITE
+
+    def solve(self):
+        rowNum, colNum = self.size
+        white = sum(1 << x for x in range(colNum))
+        black = sum(1 << (x + colNum*(rowNum-1)) for x in range(colNum))
+        start = self.canonical(self.encode(white, black, WHITE))
+
+        seen = {start}
+        stack = [start]
+        while stack:
+            key = stack.pop()
+            white, black, color = self.decode(key)
+            if self.isDecided(white, black):
+                continue
+            for child in self.children(key):
+                child = self.canonical(child)
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+
+        self.keys = keys = array("Q", sorted(seen))
+        del seen
+        size = len(keys)
+
+        self.table = table = bytearray([UNKNOWN]) * size
+        remaining = array("B", bytes(size))
+        # A position is resolved by the symmetry classes of its children,
+        # so both children and parents are counted once per class.
+        queue = deque()
+        for index, key in enumerate(keys):
+            white, black, color = self.decode(key)
+            if self.isDecided(white, black):
+                moveNum = 0
+            else:
+                moveNum = len({self.canonical(child) for child in self.children(key)})
+            if moveNum == 0:
+                table[index] = 0
+                queue.append(index)
+            else:
+                remaining[index] = moveNum
+
+        while queue:
+            index = queue.popleft()
+            value = table[index]
+            distance = (value & ~WIN_FLAG) + 1
+            for parent in {self.canonical(parent) for parent in self.parents(keys[index])}:
+                parentIndex = self.index(parent)
+                if parentIndex is None or table[parentIndex] != UNKNOWN:
+                    continue
+                white, black, color = self.decode(parent)
+                if self.isDecided(white, black):
+                    continue
+                if not (value & WIN_FLAG):
+                    table[parentIndex] = WIN_FLAG | distance
+                    queue.append(parentIndex)
+                else:
+                    remaining[parentIndex] -= 1
+                    if remaining[parentIndex] == 0:
+                        table[parentIndex] = distance
+                        queue.append(parentIndex)
+
+    def index(self, key):
+        keys = self.keys
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return index
+        return None
+
+    def lookup(self, key):
+        index = self.index(self.canonical(key))
+        if index is None:
+            raise KeyError("Position is not reachable from the initial position")
+        value = self.table[index]
+        return bool(value & WIN_FLAG), value & ~WIN_FLAG
+
+    def value(self, game):
+        """
+            (wins, distance) for the side to move in game: whether it wins
+            under perfect play and in how many plies the game ends.
+        """
+        return self.lookup(self.gameKey(game))
+
+    def childKey(self, key, move):
+        white, black, color = self.decode(key)
+        colNum = self.size[1]
+        startBit = 1 << (move.start[0] + colNum*move.start[1])
+        endBit = 1 << (move.end[0] + colNum*move.end[1])
+        if color == WHITE:
+            return self.encode(white ^ startBit | endBit, black & ~endBit, BLACK)
+        return self.encode(white & ~endBit, black ^ startBit | endBit, WHITE)
+
+    def bestMove(self, game):
+        """
+            The fastest winning move, or the slowest losing one.
+        """
+        key = self.gameKey(game)
+        best = None
+        bestRank = None
+        for move in game.legalMoves():
+            opponentWins, distance = self.lookup(self.childKey(key, move))
+            rank = (1, -distance) if opponentWins else (0, distance)
+            if best is None or rank < bestRank:
+                best, bestRank = move, rank
+        return best
+
+SOLVERS = {}
+
+def solverFor(size):
+    if type(size) == int:
+        size = (size,size)
+    if size not in SOLVERS:
+        SOLVERS[size] = HexapawnSolver(size)
+    return SOLVERS[size]
+
+def perfectMove(game):
+    if not isinstance(game, nPawnGame):
+        raise ValueError("perfectMove only plays nPawnGame, not {}".format(type(game).__name__))
+    return solverFor(game.size).bestMove(game)
@@ -0,0 +1,203 @@
+"""
+    Fixed-shape NumPy encodings of positions and moves for training, and
+    chunked .npy shards that can be memory-mapped.
+
+    nPawnGame planes (3, rows, cols):
+        0 white pawns, 1 black pawns, 2 side to move (all ones for black)
+    kyotoShogiGame planes (39, 5, 5):
+        0-17  one plane per piece type and color, PIECE_ID order, white first
+        18-19 white / black pieces whose original type differs from their
+              current one
+        20-37 hand counts per piece type and color, same order as 0-17
+        38    side to move
+
+    Policy indices:
+        nPawnGame       kind*rows*cols + y*cols + x, kind 0 for forward and
+                        1 / 2 for captures towards +x / -x (as in batch.py)
+        kyotoShogiGame  board moves (from*squares + to)*2 + promote, then
+                        drops 2*squares*squares + pieceId*squares + to
+"""
+import glob
+import os
+
+import numpy as np
+
+from .chess.nPawn import nPawnGame
+from .shogi.kyotoShogi import PIECE_ID, WHITE, BLACK
+
+PIECE_COUNT = len(PIECE_ID)
+KYOTO_PLANES = 4*PIECE_COUNT + 3
+
+def planeShape(game):
+    rowNum, colNum = game.size
+    if isinstance(game, nPawnGame):
+        return (3, rowNum, colNum)
+    return (KYOTO_PLANES, rowNum, colNum)
+
+def policySize(game):
+    rowNum, colNum = game.size
+    if isinstance(game, nPawnGame):
+        return 3*rowNum*colNum
+    squareNum = rowNum*colNum
+    return (2*squareNum + PIECE_COUNT)*squareNum
+
+def encodePosition(game, out=None):
+    if out is None:
+        out = np.zeros(planeShape(game), dtype=np.uint8)
+    else:
+        out[...] = 0
+
+    if isinstance(game, nPawnGame):
+        for (x, y), piece in game.board.items():
+            out[0 if piece.color == WHITE else 1, y, x] = 1
+        if game.currentColor == BLACK:
+            out[2] = 1
+        return out
+
+    for (x, y), piece in game.board.items():
+        side = 0 if piece.color == WHITE else 1
+        out[side*PIECE_COUNT + PIECE_ID[type(piece)], y, x] = 1
+        if piece.original is not type(piece):
+            out[2*PIECE_COUNT + side, y, x] = 1
+    for side, color in enumerate([WHITE, BLACK]):
+        for pieceType, count in game.captured[color].items():
+            out[2*PIECE_COUNT + 2 + side*PIECE_COUNT + PIECE_ID[pieceType]] = count
+    if game.currentColor == BLACK:
+        out[KYOTO_PLANES-1] = 1
+    return out
+
+def moveIndex(game, move):
+    rowNum, colNum = game.size
+    if isinstance(game, nPawnGame):
+        (x, y), (xx, yy) = move.start, move.end
+        kind = 0 if xx == x else (1 if xx > x else 2)
+        return kind*rowNum*colNum + y*colNum + x
+
+    squareNum = rowNum*colNum
+    xx, yy = move.end
+    end = yy*colNum + xx
+    if move.drop:
+        return (2*squareNum + PIECE_ID[type(move.piece)])*squareNum + end
+    x, y = move.start
+    return ((y*colNum + x)*squareNum + end)*2 + int(move.promote)
+
+def indexMove(game, index):
+    """
+        The legal move of game with the given policy index, or None.
+    """
+    for move in game.legalMoves():
+        if moveIndex(game, move) == index:
+            return move
+    return None
+
+def legalMask(game):
+    mask = np.zeros(policySize(game), dtype=bool)
+    for move in game.legalMoves():
+        mask[moveIndex(game, move)] = True
+    return mask
+
+class ShardWriter():
+    """
+        Appends (planes, policy index, value) samples to numbered shards in
+        a directory. Every shard is stored as three .npy files so that it
+        can be opened with np.load(..., mmap_mode="r") by ShardReader; at
+        most one shard is held in memory while writing.
+    """
+    def __init__(self, directory, planeShape, shardSize=1<<16):
+        self.directory = directory
+        self.planeShape = tuple(planeShape)
+        self.shardSize = shardSize
+        os.makedirs(directory, exist_ok=True)
+        self.shardIndex = len(shardPaths(directory))
+        self.planes = np.zeros((shardSize,) + self.planeShape, dtype=np.uint8)
+        self.policy = np.zeros(shardSize, dtype=np.int32)
+        self.value = np.zeros(shardSize, dtype=np.int8)
+        self.count = 0
+
+    def add(self, game, move, value):
+        """
+            Add the position of game with the move played in it and the final
+            result from the side to move's view (1 win, -1 loss, 0 draw).
+        """
+        encodePosition(game, self.planes[self.count])
+        self.policy[self.count] = -1 if move is None else moveIndex(game, move)
+        self.value[self.count] = value
+        self.count += 1
+        if self.count == self.shardSize:
+            self.flush()
+
+    def addGame(self, game, moves, winner):
+        """
+            Replay moves from game (left unchanged) and add every position
+            reached before a move, valued by winner.
+        """
+        game = game.copy()
+        for move in moves:
+            if winner is None:
+                value = 0
+            else:
+                value = 1 if winner == game.currentColor else -1
+            self.add(game, move, value)
+            game.push(move)
+
+    def flush(self):
+        if self.count == 0:
+            return
+        prefix = os.path.join(self.directory, "shard-{:05d}".format(self.shardIndex))
+        np.save(prefix + "-policy.npy", self.policy[:self.count])
+        np.save(prefix + "-value.npy", self.value[:self.count])
+        np.save(prefix + "-planes.npy", self.planes[:self.count])
+        self.shardIndex += 1
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def shardPaths(directory):
+    return sorted(path[:-len("-planes.npy")]
+                  for path in glob.glob(os.path.join(directory, "shard-*-planes.npy")))
+
+class ShardReader():
+    """
+        Memory-mapped view of all shards in a directory, indexable as one
+        sequence of (planes, policy, value) samples.
+    """
+    def __init__(self, directory):
+        self.shards = []
+        self.offsets = [0]
+        for prefix in shardPaths(directory):
+            planes = np.load(prefix + "-planes.npy", mmap_mode="r")
+            policy = np.load(prefix + "-policy.npy", mmap_mode="r")
+            value = np.load(prefix + "-value.npy", mmap_mode="r")
+            self.shards.append((planes, policy, value))
+            self.offsets.append(self.offsets[-1] + len(policy))
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not (0 <= index < len(self)):
+            raise IndexError(index)
+        shard = np.searchsorted(self.offsets, index, side="right") - 1
+        planes, policy, value = self.shards[shard]
+        local = index - self.offsets[shard]
+        return planes[local], policy[local], value[local]
+
+    def batches(self, batchSize):
+        """
+            Yield (planes, policy, value) arrays of up to batchSize samples,
+            reading one slice of one shard at a time.
+        """
+        for planes, policy, value in self.shards:
+            for start in range(0, len(policy), batchSize):
+                end = start + batchSize
+                yield (np.asarray(planes[start:end]), np.asarray(policy[start:end]),
+                       np.asarray(value[start:end]))
@@ -0,0 +1,346 @@
+"""
+    A long-running analysis engine speaking a line-based protocol modelled
+    on USI/UCI, so that tables and caches stay loaded between requests.
+
+    python -m ChessLike.engine [--variant kyoto] [--tablebase kyoto3.ctb]
+
+    usi                                    identify; answered by usiok
+    isready                                answered by readyok
+    setoption name <name> value <value>    see OPTIONS
+    newgame                                clear the search caches
+    variant <name>                         kyoto, hexapawn:4x4, ...
+    position [startpos | fen <fen>] [moves <move> ...]
+    go [depth <n>] [movetime <ms>] [nodes <n>] [infinite]
+    stop                                   end the search early
+    batch [depth <n>] [movetime <ms>] [nodes <n>]
+                                           analyse the positions on the
+                                           following lines, written as after
+                                           "position", up to a line "end"
+    d                                      print the position as FEN
+    quit
+
+    go answers with one "info ... multipv <k> ... pv <moves>" line per line
+    of play and "bestmove <move>" ("bestmove none" without legal moves, or
+    after an "info string error: ..." line if the search failed).
+    Moves are written as str(Move), e.g. "S2e-2d=", "P*3c" or "a1-a2". A
+    batch answers with "batchinfo <index> ..." and "batchbestmove <index>
+    <move>" (or "batcherror <index> <message>" if the position cannot be
+    read or searched) for every position, then "batchend". Searches run in
+    a thread, so stop is read while they run.
+"""
+import argparse
+import sys
+import threading
+
+from .book import OpeningBook
+from .records import matchNotation
+from .search import Searcher, TranspositionTable, WIN, MATE_BOUND
+from .shogi import tablebase
+from .variants import makeGame, parseVariant
+
+NAME = "ChessLike"
+
+OPTIONS = {"MultiPV"  : ("spin", 1),
+           "TTSize"   : ("spin", 1<<18),
+           "Tablebase": ("string", ""),
+           "Book"     : ("string", "")}
+
+def parseLimits(tokens):
+    """
+        (depth, time limit in seconds, node limit) of the arguments of go.
+        infinite searches until stop (or depth 64).
+    """
+    depth = timeLimit = nodeLimit = None
+    index = 0
+    while index < len(tokens):
+        token = tokens[index]
+        if token == "infinite":
+            depth = 64
+            index += 1
+            continue
+        if index+1 >= len(tokens):
+            raise ValueError("Missing value for {}".format(token))
+        value = int(tokens[index+1])
+        if token == "depth":
+            depth = value
+        elif token == "movetime":
+            timeLimit = value / 1000
+        elif token == "nodes":
+            nodeLimit = value
+        else:
+            raise ValueError("Unknown limit: {}".format(token))
+        index += 2
+    return depth, timeLimit, nodeLimit
+
+def scoreText(score):
+    if abs(score) >= MATE_BOUND:
+        plies = WIN - abs(score)
+        return "mate {}".format(plies if score > 0 else -plies)
+    return "cp {}".format(score)
+
+def infoText(line, index):
+    return "depth {} multipv {} score {} nodes {} time {} pv {}".format(
+            line.depth, index, scoreText(line.score), line.nodes,
+            int(line.elapsed*1000), " ".join(str(move) for move in line.pv))
+
+class Engine():
+    def __init__(self, variant="kyoto", output=None):
+        self.output = sys.stdout if output is None else output
+        self.outputLock = threading.Lock()
+        self.variant = variant
+        self.gameType = parseVariant(variant)[0]
+        self.game = makeGame(variant)
+        self.options = {name: default for name, (kind, default) in OPTIONS.items()}
+        self.searcher = Searcher(ttSize=self.options["TTSize"])
+        self.book = None
+        self.thread = None
+        self.infinite = False
+        self.stopping = False
+        self.batch = None
+
+        self.commands = {"usi"      : self.usi,
+                         "uci"      : self.usi,
+                         "isready"  : self.isReady,
+                         "setoption": self.setOption,
+                         "newgame"  : self.newGame,
+                         "usinewgame": self.newGame,
+                         "ucinewgame": self.newGame,
+                         "variant"  : self.setVariant,
+                         "position" : self.setPosition,
+                         "go"       : self.go,
+                         "stop"     : self.stop,
+                         "batch"    : self.startBatch,
+                         "d"        : self.display}
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        """
+            Run one command line; returns False on quit.
+        """
+        if not (self.batch is None):
+            self.addBatchLine(line.strip())
+            return True
+
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "quit":
+            self.stop()
+            return False
+        if command not in self.commands:
+            self.send("info string unknown command: {}".format(command))
+            return True
+        try:
+            self.commands[command](arguments)
+        except (ValueError, KeyError, OSError) as error:
+            self.send("info string error: {}".format(error))
+        return True
+
+    def run(self, lines=None):
+        if lines is None:
+            lines = sys.stdin
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+
+    def usi(self, arguments):
+        self.send("id name {}".format(NAME))
+        for name, (kind, default) in OPTIONS.items():
+            self.send("option name {} type {} default {}".format(name, kind, default))
+        self.send("usiok")
+
+    def isReady(self, arguments):
+        self.send("readyok")
+
+    def setOption(self, arguments):
+        if not arguments or arguments[0] != "name":
+            raise ValueError("Expected setoption name <name> value <value>")
+        if "value" in arguments:
+            split = arguments.index("value")
+            name = " ".join(arguments[1:split])
+            value = " ".join(arguments[split+1:])
+        else:
+            name = " ".join(arguments[1:])
+            value = ""
+        if name not in OPTIONS:
+            raise ValueError("Unknown option: {}".format(name))
+        self.waitSearch()
+
+        if OPTIONS[name][0] == "spin":
+            value = int(value)
+        self.options[name] = value
+        if name == "TTSize":
+            self.searcher.tt = TranspositionTable(value)
+        elif name == "Tablebase" and value:
+            tablebase.loadTablebase(value)
+            self.searcher.probe = tablebase.probe
+        elif name == "Book":
+            self.book = OpeningBook(value) if value else None
+
+    def newGame(self, arguments):
+        self.waitSearch()
+        self.searcher.tt.clear()
+        self.searcher.historyScores = {}
+
+    def setVariant(self, arguments):
+        if len(arguments) != 1:
+            raise ValueError("Expected variant <name>")
+        self.waitSearch()
+        self.gameType = parseVariant(arguments[0])[0]
+        self.variant = arguments[0]
+        self.game = makeGame(self.variant)
+
+    def parsePosition(self, arguments):
+        """
+            The game described by the arguments of position.
+        """
+        if "moves" in arguments:
+            split = arguments.index("moves")
+            arguments, moves = arguments[:split], arguments[split+1:]
+        else:
+            moves = []
+
+        if not arguments or arguments == ["startpos"]:
+            game = makeGame(self.variant)
+        elif arguments[0] == "fen":
+            game = self.gameType.fromFEN(" ".join(arguments[1:]))
+        else:
+            raise ValueError("Expected startpos or fen: {}".format(" ".join(arguments)))
+
+        for text in moves:
+            move = matchNotation(game, text)
+            if move is None:
+                raise ValueError("Illegal move: {}".format(text))
+            game.push(move)
+        return game
+
+    def setPosition(self, arguments):
+        self.game = self.parsePosition(arguments)
+
+    def display(self, arguments):
+        self.send("info string fen {}".format(self.game.toFEN()))
+
+    def go(self, arguments):
+        limits = parseLimits(arguments)
+        self.waitSearch()
+        self.startSearch(self.searchPosition, (self.game.copy(), limits))
+        self.infinite = "infinite" in arguments
+
+    def searchPosition(self, game, limits):
+        try:
+            bestMove = self.findMove(game, limits)
+        except Exception as error:
+            # Without a bestmove the GUI would wait forever
+            self.send("info string error: {}: {}".format(type(error).__name__, error))
+            bestMove = None
+        self.send("bestmove {}".format("none" if bestMove is None else bestMove))
+
+    def findMove(self, game, limits):
+        if not (self.book is None):
+            move = self.book.choose(game, best=True)
+            if not (move is None):
+                self.send("info string book move")
+                return move
+        lines = self.searcher.searchLines(game, *limits, multiPV=self.options["MultiPV"])
+        for index, line in enumerate(lines, 1):
+            if line.pv:
+                self.send("info " + infoText(line, index))
+        return lines[0].bestMove
+
+    def startBatch(self, arguments):
+        self.batch = (parseLimits(arguments), [])
+
+    def addBatchLine(self, line):
+        limits, positions = self.batch
+        if line != "end":
+            if line:
+                positions.append(line)
+            return
+        self.batch = None
+        self.waitSearch()
+        self.startSearch(self.searchBatch, (positions, limits))
+
+    def searchBatch(self, positions, limits):
+        for index, text in enumerate(positions):
+            if self.stopping:
+                break
+            try:
+                self.searchBatchLine(index, text, limits)
+            except Exception as error:
+                self.send("batcherror {} {}: {}".format(index, type(error).__name__, error))
+        self.send("batchend")
+
+    def searchBatchLine(self, index, text, limits):
+        tokens = text.split()
+        if tokens and tokens[0] == "position":
+            tokens = tokens[1:]
+        try:
+            game = self.parsePosition(tokens)
+        except (ValueError, KeyError) as error:
+            self.send("batcherror {} {}".format(index, error))
+            return
+        lines = self.searcher.searchLines(game, *limits, multiPV=self.options["MultiPV"])
+        for pvIndex, line in enumerate(lines, 1):
+            if line.pv:
+                self.send("batchinfo {} {}".format(index, infoText(line, pvIndex)))
+        bestMove = lines[0].bestMove
+        self.send("batchbestmove {} {}".format(index, "none" if bestMove is None else bestMove))
+
+    def startSearch(self, target, args):
+        self.infinite = False
+        self.stopping = False
+        self.thread = threading.Thread(target=target, args=args, daemon=True)
+        self.thread.start()
+
+    def stop(self, arguments=None):
+        """
+            Stop the running search, which then reports its best move.
+        """
+        if self.thread is None:
+            return
+        self.stopping = True
+        # The searcher clears its flag when a search starts, so keep
+        # asking until the thread is done.
+        while self.thread.is_alive():
+            self.searcher.stop()
+            self.thread.join(0.01)
+        self.thread = None
+
+    def waitSearch(self):
+        """
+            Let the running search finish; an infinite one is stopped.
+        """
+        if self.infinite:
+            self.stop()
+        if not (self.thread is None):
+            self.thread.join()
+            self.thread = None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ChessLike.engine")
+    parser.add_argument("--variant", default="kyoto")
+    parser.add_argument("--multipv", type=int, default=1)
+    parser.add_argument("--tt-size", type=int, default=1<<18)
+    parser.add_argument("--tablebase", nargs="*", default=[])
+    parser.add_argument("--book", default="")
+    args = parser.parse_args(argv)
+
+    engine = Engine(args.variant)
+    engine.handle("setoption name MultiPV value {}".format(args.multipv))
+    if args.tt_size != OPTIONS["TTSize"][1]:
+        engine.handle("setoption name TTSize value {}".format(args.tt_size))
+    for path in args.tablebase:
+        engine.handle("setoption name Tablebase value {}".format(path))
+    if args.book:
+        engine.handle("setoption name Book value {}".format(args.book))
+    engine.run()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,168 @@
+"""
+    Opt-in call counters and timers for the game hot paths.
+
+    enable() replaces the methods listed in TARGETS by wrappers that count
+    calls and add up their (inclusive) run time; disable() puts the
+    originals back, so nothing is measured or slowed down otherwise.
+
+        from ChessLike import instrument
+        with instrument.instrumented():
+            perft(makeGame("kyoto"), 3)
+        instrument.printReport()
+
+    Piece methods are counted under the class of the piece they are called
+    on, so the Kyoto pieces sharing ShogiPiece.legalMoves are still told
+    apart; a call made from an override (King calling ShogiPiece) keeps
+    the name of the class defining the method.
+
+    kyotoShogiGame.checkInfo is only called on the check path of legalMoves
+    and legalMoveCodes, so its count is the number of move generations made
+    while in check. BitboardKyotoShogi answers checks and pins with
+    checkMasks and moveTargets instead, counted under their own names along
+    with _updateMasks, the cost of keeping the attack masks up to date.
+"""
+import time
+from contextlib import contextmanager
+
+from .base import Piece
+from .chess.nPawn import nPawnGame, Pawn
+from .shogi.kyotoShogi import kyotoShogiGame, ShogiPiece, King
+from .shogi.bitboard import BitboardKyotoShogi
+
+GAME_METHODS = ["legalMoves", "legalMoveCodes", "isAttacked", "attackedBy",
+                "checkInfo", "isChecked", "winner", "play", "peek", "copy",
+                "push", "pop"]
+
+# The bitboard backend checks and pins through its masks, not checkInfo
+BITBOARD_METHODS = GAME_METHODS + ["checkMasks", "moveTargets", "hasLegalMove",
+                                   "_updateMasks"]
+
+TARGETS = [(nPawnGame, GAME_METHODS), (kyotoShogiGame, GAME_METHODS),
+           (BitboardKyotoShogi, BITBOARD_METHODS), (Pawn, ["legalMoves"]),
+           (ShogiPiece, ["legalMoves"]), (King, ["legalMoves"])]
+
+STATS = {}
+_patched = []
+_started = None
+
+def wrap(name, function):
+    stats = STATS.setdefault(name, [0, 0.0])
+    clock = time.perf_counter
+
+    def wrapper(*args, **kargs):
+        start = clock()
+        try:
+            return function(*args, **kargs)
+        finally:
+            stats[0] += 1
+            stats[1] += clock() - start
+
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+def wrapPiece(name, function):
+    """
+        wrap for a piece method, counted per class of the piece.
+    """
+    methodName = function.__name__
+    clock = time.perf_counter
+    classStats = {}
+
+    def wrapper(self, *args, **kargs):
+        pieceType = type(self)
+        stats = classStats.get(pieceType)
+        if stats is None:
+            label = name
+            if getattr(pieceType, methodName) is wrapper:
+                label = "{}.{}.{}".format(pieceType.__module__.rsplit(".", 1)[-1],
+                                          pieceType.__name__, methodName)
+            stats = classStats[pieceType] = STATS.setdefault(label, [0, 0.0])
+        start = clock()
+        try:
+            return function(self, *args, **kargs)
+        finally:
+            stats[0] += 1
+            stats[1] += clock() - start
+
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+def enable(targets=None):
+    """
+        Instrument the methods of targets, a list of (class, method names);
+        only methods defined by the class itself are wrapped.
+    """
+    global _started
+    if _patched:
+        return
+    if targets is None:
+        targets = TARGETS
+    for owner, names in targets:
+        for name in names:
+            if name not in owner.__dict__:
+                continue
+            original = owner.__dict__[name]
+            _patched.append((owner, name, original))
+            label = "{}.{}.{}".format(owner.__module__.rsplit(".", 1)[-1], owner.__name__, name)
+            wrapWith = wrapPiece if issubclass(owner, Piece) else wrap
+            setattr(owner, name, wrapWith(label, original))
+    _started = time.perf_counter()
+
+def disable():
+    while _patched:
+        owner, name, original = _patched.pop()
+        setattr(owner, name, original)
+
+def isEnabled():
+    return bool(_patched)
+
+def reset():
+    global _started
+    for stats in STATS.values():
+        stats[0] = 0
+        stats[1] = 0.0
+    _started = time.perf_counter() if _patched else None
+
+@contextmanager
+def instrumented(targets=None):
+    enable(targets)
+    try:
+        yield STATS
+    finally:
+        disable()
+
+def count(name):
+    return STATS.get(name, [0, 0.0])[0]
+
+def report(elapsed=None):
+    """
+        Rows of (name, calls, total seconds, mean seconds, calls per second
+        of wall time) for every method called since the last reset, most
+        total time first. elapsed defaults to the time since enable() or
+        reset(). The rate of push is the node rate of perft and search.
+    """
+    if elapsed is None:
+        elapsed = time.perf_counter() - _started if not (_started is None) else 0.0
+    rows = []
+    for name, (calls, seconds) in STATS.items():
+        if calls == 0:
+            continue
+        rate = calls / elapsed if elapsed > 0 else 0.0
+        rows.append((name, calls, seconds, seconds / calls, rate))
+    rows.sort(key=lambda row: -row[2])
+    return rows
+
+def formatReport(elapsed=None):
+    lines = ["{:44s} {:>10s} {:>10s} {:>10s} {:>12s}".format(
+                "method", "calls", "total s", "mean us", "calls/s")]
+    for name, calls, seconds, mean, rate in report(elapsed):
+        lines.append("{:44s} {:10d} {:10.3f} {:10.2f} {:12.0f}".format(
+                name, calls, seconds, mean*1e6, rate))
+    return "\n".join(lines)
+
+def printReport(elapsed=None):
+    print(formatReport(elapsed))
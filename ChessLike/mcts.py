@@ -0,0 +1,186 @@
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+class Node():
+    __slots__ = ("move", "mover", "hash", "winner", "children", "untried",
+                 "visits", "wins")
+
+    def __init__(self, game, move=None):
+        self.move = move
+        self.mover = game.otherColor(game.currentColor)
+        self.hash = game.hash()
+        self.children = []
+        if getattr(game, "decidedByMoves", False):
+            self.untried = game.legalMoves()
+            self.winner = None if self.untried else self.mover
+        else:
+            self.winner = game.winner()
+            self.untried = None if not (self.winner is None) else game.legalMoves()
+        if self.untried:
+            random.shuffle(self.untried)
+        self.visits = 0
+        self.wins = 0.0
+
+    def select(self, exploration):
+        logVisits = math.log(self.visits)
+        best = None
+        bestValue = None
+        for child in self.children:
+            value = (child.wins / child.visits
+                     + exploration * math.sqrt(logVisits / child.visits))
+            if best is None or value > bestValue:
+                best, bestValue = child, value
+        return best
+
+def rollout(game, maxPlies):
+    """
+        Play random moves in place until the game is decided or maxPlies
+        moves were made, undo them and return the winner (None for a draw).
+        The moves of every ply are generated once: a side without legal
+        moves loses, and game.winner() is only asked as well for games
+        that can end otherwise (decidedByMoves unset), where it is O(1).
+    """
+    byMoves = getattr(game, "decidedByMoves", False)
+    plies = 0
+    winner = None
+    while True:
+        if not byMoves:
+            winner = game.winner()
+            if not (winner is None):
+                break
+        codes = game.legalMoveCodes()
+        if not codes:
+            winner = game.otherColor(game.currentColor)
+            break
+        if plies >= maxPlies:
+            break
+        game.push(game.decodeMove(random.choice(codes)))
+        plies += 1
+    for ply in range(plies):
+        game.pop()
+    return winner
+
+class MCTSPlayer():
+    """
+        UCT Monte Carlo tree search with random playouts.
+
+        The player is called like the functions in player.py. Its tree is
+        kept between calls and re-rooted at the current position when that
+        position was already searched, e.g. after our move and the reply.
+        Every search runs until iterations playouts were made or timeLimit
+        seconds passed, whichever comes first. With workers > 1 the search
+        is root-parallel: every process grows its own tree from the same
+        position and the visit counts of the root moves are summed.
+        Moves are always played and undone in place, never copied.
+    """
+    def __init__(self, iterations=10000, timeLimit=None, exploration=1.4,
+                 maxPlies=200, workers=1):
+        self.iterations = iterations
+        self.timeLimit = timeLimit
+        self.exploration = exploration
+        self.maxPlies = maxPlies
+        self.workers = workers
+        self.root = None
+
+    def __call__(self, game):
+        if self.workers > 1:
+            return self.parallelMove(game)
+
+        self.search(game)
+        if not self.root.children:
+            moves = game.legalMoves()
+            return random.choice(moves) if moves else None
+        best = max(self.root.children, key=lambda child: child.visits)
+        return self.matchMove(game, str(best.move))
+
+    def rootFor(self, game):
+        key = game.hash()
+        if not (self.root is None):
+            if self.root.hash == key:
+                return self.root
+            for child in self.root.children:
+                if child.hash == key:
+                    return child
+                for grandchild in child.children:
+                    if grandchild.hash == key:
+                        return grandchild
+        return Node(game)
+
+    def search(self, game):
+        game = game.copy()
+        self.root = root = self.rootFor(game)
+        deadline = None if self.timeLimit is None else time.time() + self.timeLimit
+
+        # The first iteration always runs, so that the root gets a child
+        for iteration in range(max(self.iterations, 1)):
+            if iteration > 0 and not (deadline is None) and time.time() >= deadline:
+                break
+
+            node = root
+            path = [root]
+            while not node.untried and node.children:
+                node = node.select(self.exploration)
+                game.push(node.move)
+                path.append(node)
+
+            if node.untried:
+                move = node.untried.pop()
+                game.push(move)
+                node = Node(game, move)
+                path[-1].children.append(node)
+                path.append(node)
+
+            if node.winner is None:
+                winner = rollout(game, self.maxPlies)
+            else:
+                winner = node.winner
+
+            for ply in range(len(path)-1):
+                game.pop()
+            for visited in path:
+                visited.visits += 1
+                if winner is None:
+                    visited.wins += 0.5
+                elif winner == visited.mover:
+                    visited.wins += 1
+        return root
+
+    def rootVisits(self):
+        return {str(child.move): (child.visits, child.wins)
+                for child in self.root.children}
+
+    def parallelMove(self, game):
+        game = game.copy()
+        seeds = [random.getrandbits(32) for worker in range(self.workers)]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(searchVisits, game, seed, self.iterations,
+                                       self.timeLimit, self.exploration, self.maxPlies)
+                       for seed in seeds]
+            merged = {}
+            for future in futures:
+                for moveKey, (visits, wins) in future.result().items():
+                    total = merged.get(moveKey, (0, 0.0))
+                    merged[moveKey] = (total[0] + visits, total[1] + wins)
+
+        self.root = None
+        if not merged:
+            moves = game.legalMoves()
+            return random.choice(moves) if moves else None
+        best = max(merged, key=lambda moveKey: merged[moveKey][0])
+        return self.matchMove(game, best)
+
+    def matchMove(self, game, moveKey):
+        for move in game.legalMoves():
+            if str(move) == moveKey:
+                return move
+
+def searchVisits(game, seed, iterations, timeLimit, exploration, maxPlies):
+    random.seed(seed)
+    searcher = MCTSPlayer(iterations, timeLimit, exploration, maxPlies)
+    searcher.search(game)
+    return searcher.rootVisits()
+
+def mctsMove(game):
+    return MCTSPlayer(iterations=1000)(game)
@@ -0,0 +1,133 @@
+"""
+    Sorted fixed-width record files searched through mmap.
+
+    A table file holds MAGIC, a struct header (value format length and
+    metadata length), the value format, JSON metadata and then the records
+    sorted by key. Every record is a uint64 key followed by a value packed
+    with the table's struct format, so record i starts at a fixed offset
+    and a key is found by bisection without reading the file. Several
+    records may share a key. Processes opening the same file share its
+    pages through the OS page cache.
+"""
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b"CLTB\x01"
+HEADER = struct.Struct("<HI")
+KEY = struct.Struct("<Q")
+
+def writeTable(path, records, valueFormat, meta=None):
+    """
+        Write (key, value) pairs to path, where value is a tuple for
+        valueFormat (e.g. "<H"). Records are sorted by key; the order of
+        records with the same key is kept.
+    """
+    recordStruct = struct.Struct("<Q" + valueFormat.lstrip("<=!>@"))
+    metaBytes = json.dumps(meta if not (meta is None) else {}).encode()
+    formatBytes = valueFormat.encode()
+
+    records = sorted(records, key=lambda record: record[0])
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(formatBytes), len(metaBytes)))
+        f.write(formatBytes)
+        f.write(metaBytes)
+        for key, value in records:
+            f.write(recordStruct.pack(key, *value))
+    os.replace(tmpPath, path)
+    return len(records)
+
+class MappedTable():
+    """
+        Read-only view of a table file. get(key) and getAll(key) bisect the
+        memory-mapped records.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError("Not a table file: {}".format(path))
+
+        offset = len(MAGIC)
+        formatLength, metaLength = HEADER.unpack_from(self.buffer, offset)
+        offset += HEADER.size
+        self.valueFormat = self.buffer[offset:offset+formatLength].decode()
+        offset += formatLength
+        self.meta = json.loads(self.buffer[offset:offset+metaLength].decode())
+        offset += metaLength
+
+        self.value = struct.Struct(self.valueFormat)
+        self.recordSize = KEY.size + self.value.size
+        self.start = offset
+        self.count = (len(self.buffer) - offset) // self.recordSize
+
+    def __len__(self):
+        return self.count
+
+    def key(self, index):
+        return KEY.unpack_from(self.buffer, self.start + index*self.recordSize)[0]
+
+    def record(self, index):
+        offset = self.start + index*self.recordSize
+        return (KEY.unpack_from(self.buffer, offset)[0],
+                self.value.unpack_from(self.buffer, offset + KEY.size))
+
+    def lowerBound(self, key):
+        low, high = 0, self.count
+        unpack = KEY.unpack_from
+        buffer = self.buffer
+        start = self.start
+        recordSize = self.recordSize
+        while low < high:
+            mid = (low + high) >> 1
+            if unpack(buffer, start + mid*recordSize)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def get(self, key, default=None):
+        """
+            The value of the first record with key.
+        """
+        index = self.lowerBound(key)
+        if index < self.count and self.key(index) == key:
+            return self.record(index)[1]
+        return default
+
+    def getAll(self, key):
+        """
+            The values of all records with key, in file order.
+        """
+        values = []
+        index = self.lowerBound(key)
+        while index < self.count:
+            recordKey, value = self.record(index)
+            if recordKey != key:
+                break
+            values.append(value)
+            index += 1
+        return values
+
+    def __contains__(self, key):
+        index = self.lowerBound(key)
+        return index < self.count and self.key(index) == key
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.record(index)
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,96 @@
+"""
+    Declarative piece movement compiled into per-square destination tables.
+
+    A PieceMovement lists the offsets a piece moves by, as (dx, dy) with dy
+    pointing toward the opponent. moveTable compiles it once per board size
+    and forward direction (+1 or -1, the sign of dy for the mover) into a
+    dict from square to an entry (steps, rays, captures, advances) of
+    on-board destinations, and destinations walks an entry against a
+    board into a list of moves. Every piece type of every game shares that
+    one function, so a new piece or board size only needs a definition.
+"""
+
+class PieceMovement():
+    """
+        steps      single steps onto empty squares or enemy pieces
+        slides     directions of sliding moves, up to the first piece
+        captures   steps onto enemy pieces only
+        advances   steps onto empty squares only
+        promote    the type the piece may promote to, None if it cannot
+    """
+    def __init__(self, steps=(), slides=(), captures=(), advances=(), promote=None):
+        self.steps = tuple(steps)
+        self.slides = tuple(slides)
+        self.captures = tuple(captures)
+        self.advances = tuple(advances)
+        self.promote = promote
+
+MOVE_TABLES = {}
+
+def compileMovement(movement, size, forward):
+    rowNum, colNum = size
+    inBounds = lambda x, y: (0 <= x < colNum) and (0 <= y < rowNum)
+
+    def offsets(deltas, x, y):
+        return tuple((x+dx*forward, y+dy*forward) for dx, dy in deltas
+                     if inBounds(x+dx*forward, y+dy*forward))
+
+    table = {}
+    for y in range(rowNum):
+        for x in range(colNum):
+            rays = []
+            for dx, dy in movement.slides:
+                dx, dy = dx*forward, dy*forward
+                ray = []
+                xx, yy = x+dx, y+dy
+                while inBounds(xx, yy):
+                    ray.append((xx, yy))
+                    xx, yy = xx+dx, yy+dy
+                if ray:
+                    rays.append(tuple(ray))
+            table[(x,y)] = (offsets(movement.steps, x, y), tuple(rays),
+                            offsets(movement.captures, x, y),
+                            offsets(movement.advances, x, y))
+    return table
+
+def moveTable(movement, size, forward):
+    """
+        The compiled table of movement for a board size, built on first use.
+    """
+    key = (movement, size, forward)
+    table = MOVE_TABLES.get(key)
+    if table is None:
+        table = MOVE_TABLES[key] = compileMovement(movement, size, forward)
+    return table
+
+def destinations(entry, board, color, guard=False):
+    """
+        A list of (end, capture) for the moves of a piece of color with the
+        table entry of its square. With guard set, squares held by its own
+        pieces are included as well.
+    """
+    steps, rays, captures, advances = entry
+    ends = []
+    for end in steps:
+        target = board.get(end)
+        if target is None:
+            ends.append((end, False))
+        elif guard or target.color != color:
+            ends.append((end, True))
+    for ray in rays:
+        for end in ray:
+            target = board.get(end)
+            if target is None:
+                ends.append((end, False))
+                continue
+            if guard or target.color != color:
+                ends.append((end, True))
+            break
+    for end in captures:
+        target = board.get(end)
+        if not (target is None) and (guard or target.color != color):
+            ends.append((end, True))
+    for end in advances:
+        if end not in board:
+            ends.append((end, False))
+    return ends
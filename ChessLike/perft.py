@@ -0,0 +1,157 @@
+"""
+    Move generation benchmark and correctness check.
+
+    python -m ChessLike.perft kyoto 4
+    python -m ChessLike.perft hexapawn:5x5 6 --divide
+    python -m ChessLike.perft --check
+    python -m ChessLike.perft kyoto-bitboard 3 --movegen legalMoves
+"""
+import argparse
+import time
+
+from .variants import makeGame
+
+# Node counts of the initial position at depth 1, 2, ... (perft counts
+# every legal move, including those played after the game is decided).
+KNOWN_COUNTS = {
+    "kyoto"         : [21, 434, 9425, 194785],
+    "kyoto-bitboard": [21, 434, 9425, 194785],
+    "hexapawn:3x3"  : [3, 10, 28, 62, 110, 176, 116, 82],
+    "hexapawn:4x4"  : [4, 16, 66, 280, 1170, 4714, 17804, 62308],
+    "hexapawn:5x5"  : [5, 25, 125, 628, 3180, 16270, 83654, 430064],
+    "hexapawn:6x5"  : [5, 25, 125, 625, 3128, 15692, 79028, 399918],
+    "hexapawn:5x6"  : [6, 36, 216, 1300, 7870, 48062, 295604, 1827996],
+    "hexapawn:6x6"  : [6, 36, 216, 1296, 7780, 46770, 281882, 1705140],
+    # Wider than 16 squares in one direction, past 4-bit coordinates
+    "hexapawn:4x17" : [17, 289, 4928, 84494, 1458678],
+    "hexapawn:17x4" : [4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576],
+}
+
+def perft(game, depth):
+    if depth == 0:
+        return 1
+
+    codes = game.legalMoveCodes()
+    if depth == 1:
+        return len(codes)
+
+    nodes = 0
+    for code in codes:
+        game.push(game.decodeMove(code))
+        nodes += perft(game, depth-1)
+        game.pop()
+    return nodes
+
+def divide(game, depth):
+    """
+        Perft split by root move, as a list of (move, nodes).
+    """
+    counts = []
+    for move in game.legalMoves():
+        game.push(move)
+        counts.append((move, perft(game, depth-1)))
+        game.pop()
+    return counts
+
+def benchmark(variant, depth):
+    """
+        Run perft on the initial position of variant for depth 1..depth and
+        return a list of (depth, nodes, seconds).
+    """
+    results = []
+    for d in range(1, depth+1):
+        game = makeGame(variant)
+        start = time.perf_counter()
+        nodes = perft(game, d)
+        results.append((d, nodes, time.perf_counter()-start))
+    return results
+
+def generationBenchmark(variant, depth, method="legalMoveCodes"):
+    """
+        Time game.<method>() alone on every position of the perft tree of
+        variant down to depth. Returns (positions, mean seconds per call).
+    """
+    game = makeGame(variant)
+    generate = getattr(game, method)
+    clock = time.perf_counter
+    totals = [0, 0.0]
+
+    def walk(depth):
+        start = clock()
+        generate()
+        totals[1] += clock() - start
+        totals[0] += 1
+        if depth == 0:
+            return
+        for move in game.legalMoves():
+            game.push(move)
+            walk(depth-1)
+            game.pop()
+
+    walk(depth)
+    return totals[0], totals[1] / totals[0]
+
+def check(maxNodes=500000):
+    """
+        Compare perft with KNOWN_COUNTS, skipping depths above maxNodes.
+        Returns a list of (variant, depth, expected, found) mismatches.
+    """
+    mismatches = []
+    for variant, counts in KNOWN_COUNTS.items():
+        for d, expected in enumerate(counts, 1):
+            if expected > maxNodes:
+                break
+            found = perft(makeGame(variant), d)
+            if found != expected:
+                mismatches.append((variant, d, expected, found))
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ChessLike.perft")
+    parser.add_argument("variant", nargs="?", default="kyoto")
+    parser.add_argument("depth", nargs="?", type=int, default=3)
+    parser.add_argument("--divide", action="store_true",
+                        help="print the node count below every root move")
+    parser.add_argument("--check", action="store_true",
+                        help="verify all known node counts")
+    parser.add_argument("--movegen", metavar="METHOD",
+                        help="time one move generation method (e.g. legalMoves)"
+                             " on every position of the tree instead")
+    parser.add_argument("--max-nodes", type=int, default=500000,
+                        help="largest known count verified by --check")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        mismatches = check(args.max_nodes)
+        for variant, d, expected, found in mismatches:
+            print("{} depth {}: expected {}, found {}".format(variant, d, expected, found))
+        print("OK" if not mismatches else "FAILED")
+        return 1 if mismatches else 0
+
+    if args.movegen:
+        positions, seconds = generationBenchmark(args.variant, args.depth, args.movegen)
+        print("{} {}: {} positions, {:.2f} us per call".format(
+                args.variant, args.movegen, positions, seconds*1e6))
+        return 0
+
+    if args.divide:
+        game = makeGame(args.variant)
+        total = 0
+        for move, nodes in divide(game, args.depth):
+            print("{}: {}".format(move, nodes))
+            total += nodes
+        print("total: {}".format(total))
+        return 0
+
+    known = KNOWN_COUNTS.get(args.variant, [])
+    for d, nodes, seconds in benchmark(args.variant, args.depth):
+        rate = nodes/seconds if seconds > 0 else float("inf")
+        status = ""
+        if d <= len(known):
+            status = "ok" if known[d-1] == nodes else "MISMATCH (expected {})".format(known[d-1])
+        print("depth {:2d} {:12d} nodes {:9.3f}s {:12.0f} nodes/s {}".format(
+                d, nodes, seconds, rate, status))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,13 +1,96 @@
 import random
+from collections import OrderedDict
 
-def randomMove(game): 
+from .search import mobility
+
+def randomMove(game):
     return random.choice(game.legalMoves())
 
-def minOpponents(game, eval=None):
-    if eval is None: 
-        eval = lambda move: len(game.peek(move).legalMoves())
+class CachedEval():
+    """
+        eval(game) memoized by position hash, keeping the results of the
+        maxSize most recently used positions.
+    """
+    def __init__(self, eval=None, maxSize=1<<16):
+        if eval is None:
+            eval = mobility
+
+        self.eval = eval
+        self.maxSize = maxSize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, game):
+        key = (type(game), game.size, game.hash())
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+
+        self.misses += 1
+        value = cache[key] = self.eval(game)
+        if len(cache) > self.maxSize:
+            cache.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+# The shared caches of the most recently used evals, so that fresh
+# lambdas or partials passed on every call do not pile up
+EVAL_CACHES = OrderedDict()
+MAX_EVAL_CACHES = 8
+
+def cachedEval(eval=None):
+    """
+        The shared CachedEval of eval (mobility by default).
+    """
+    if eval is None:
+        eval = mobility
+    if isinstance(eval, CachedEval):
+        return eval
+    if eval in EVAL_CACHES:
+        EVAL_CACHES.move_to_end(eval)
+        return EVAL_CACHES[eval]
+    cache = EVAL_CACHES[eval] = CachedEval(eval)
+    if len(EVAL_CACHES) > MAX_EVAL_CACHES:
+        EVAL_CACHES.popitem(last=False)
+    return cache
+
+def moveValue(game, move, eval=None):
+    """
+        eval(game) of the position after move, memoized by cachedEval.
+    """
+    game.push(move)
+    value = cachedEval(eval)(game)
+    game.pop()
+    return value
 
+def minOpponents(game, eval=None, positionEval=None):
+    """
+        A move leaving the opponent the fewest legal moves; ties are broken
+        uniformly at random. As before, eval(move) may score the moves
+        instead and is called as is. positionEval(game) scores the position
+        after each move and is memoized by position hash (see CachedEval).
+        Games with mobility and mobilityDelta (nPawnGame) count the
+        opponent's moves from the squares each move changes instead of
+        playing it. Other games (Kyoto shogi) are not incremental: every
+        move is pushed and the opponent's moves fully generated, with only
+        the cache in front.
+    """
     moves = game.legalMoves()
     random.shuffle(moves)
-    moves.sort(key=eval)
+    if not (eval is None):
+        moves.sort(key=eval)
+    elif positionEval is None and hasattr(game, "mobilityDelta"):
+        other = game.otherColor(game.currentColor)
+        current = game.mobility(other)
+        moves.sort(key=lambda move: current + game.mobilityDelta(move))
+    else:
+        evaluate = cachedEval(positionEval)
+        moves.sort(key=lambda move: moveValue(game, move, evaluate))
     return moves[0]
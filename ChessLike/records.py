@@ -0,0 +1,288 @@
+"""
+    Binary game records.
+
+    A record file starts with MAGIC and then holds the games back to back:
+        B      length of the variant name, then the name ("hexapawn", "kyoto")
+        B B    rows, columns
+        b      result: 1 if the first player won, -1 if the second player
+               won, 0 for a draw or an unfinished game
+        I      number of plies
+        then the move code of every ply (see base.py) in
+               base.codeBytes((rows, columns)) bytes
+    All numbers are little-endian. The index file path + ".idx" holds the
+    byte offset of every game as a uint64, so that RecordArchive can seek
+    to a game by number.
+"""
+import mmap
+import os
+import struct
+from array import array
+
+from .base import codeBytes
+from .variants import makeGame, variantName
+
+MAGIC = b"CLGR\x02"
+HEADER = struct.Struct("<BBbI")
+INDEX_SUFFIX = ".idx"
+
+RESULT_TEXT = {1: "1-0", -1: "0-1", 0: "*"}
+TEXT_RESULT = {text: result for result, text in RESULT_TEXT.items()}
+
+class GameRecord():
+    """
+        A game played from the initial position of a variant: its name
+        (without the size), board size, result and the move codes.
+    """
+    def __init__(self, variant, size, result, codes):
+        self.variant = variant
+        self.size = tuple(size)
+        self.result = result
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __repr__(self):
+        return "GameRecord({}, {} plies, {})".format(
+                self.variantName(), len(self.codes), RESULT_TEXT[self.result])
+
+    def variantName(self):
+        rowNum, colNum = self.size
+        return "{}:{}x{}".format(self.variant, rowNum, colNum)
+
+    def newGame(self):
+        return makeGame(self.variantName())
+
+    def winner(self, game=None):
+        if game is None:
+            game = self.newGame()
+        first = game.currentColor
+        if self.result == 1:
+            return first
+        if self.result == -1:
+            return game.otherColor(first)
+        return None
+
+    def moves(self):
+        """
+            Yield the moves of the game as Move objects.
+        """
+        game = self.newGame()
+        for code in self.codes:
+            yield game.decodeMove(code)
+
+    def positions(self):
+        """
+            Replay the game, yielding (game, move) before every move and the
+            final game with None at the end. The same game object is played
+            on in place, so copy it to keep a position.
+        """
+        game = self.newGame()
+        for code in self.codes:
+            move = game.decodeMove(code)
+            yield game, move
+            game.push(move)
+        yield game, None
+
+    def toText(self):
+        """
+            One line: the variant, the result and the moves in the notation
+            of Move.__str__.
+        """
+        return " ".join([self.variantName(), RESULT_TEXT[self.result]]
+                        + [str(move) for move in self.moves()])
+
+    @classmethod
+    def fromText(cls, line):
+        variant, result, *moves = line.split()
+        return cls.fromNotation(variant, moves, TEXT_RESULT[result])
+
+    @classmethod
+    def fromNotation(cls, variant, moves, result):
+        """
+            Record of the game of variant (e.g. "hexapawn:4x4") with moves
+            given in the notation of Move.__str__. result is 1, 0, -1 or a
+            winning color.
+        """
+        game = makeGame(variant)
+        if not isinstance(result, int) or isinstance(result, bool):
+            result = resultOf(game, result)
+        codes = []
+        for text in moves:
+            move = matchNotation(game, text)
+            if move is None:
+                raise ValueError("Illegal move {} after {} plies".format(text, len(codes)))
+            codes.append(game.encodeMove(move))
+            game.push(move)
+        return cls(variant.partition(":")[0], game.size, result, codes)
+
+    @classmethod
+    def fromGame(cls, game, winner=False):
+        """
+            Record of the moves pushed on game since its initial position.
+            The result is game.winner() unless a winner (or None) is given.
+        """
+        if winner is False:
+            winner = game.winner()
+        first = game.currentColor if len(game.history) % 2 == 0 else game.otherColor(game.currentColor)
+        result = 0 if winner is None else (1 if winner == first else -1)
+        codes = [game.encodeMove(entry[0]) for entry in game.history]
+        return cls(variantName(game).partition(":")[0], game.size, result, codes)
+
+    def pack(self):
+        name = self.variant.encode()
+        rowNum, colNum = self.size
+        data = bytearray([len(name)])
+        data += name
+        data += HEADER.pack(rowNum, colNum, self.result, len(self.codes))
+        width = codeBytes(self.size)
+        for code in self.codes:
+            data += code.to_bytes(width, "little")
+        return bytes(data)
+
+def resultOf(game, winner):
+    if winner is None:
+        return 0
+    return 1 if winner == game.currentColor else -1
+
+def matchNotation(game, text):
+    for move in game.legalMoves():
+        if str(move) == text:
+            return move
+    return None
+
+def unpackRecord(buffer, offset):
+    """
+        The GameRecord stored at offset of buffer and the offset after it.
+    """
+    nameLength = buffer[offset]
+    offset += 1
+    variant = bytes(buffer[offset:offset+nameLength]).decode()
+    offset += nameLength
+    rowNum, colNum, result, plies = HEADER.unpack_from(buffer, offset)
+    offset += HEADER.size
+    width = codeBytes((rowNum, colNum))
+    end = offset + plies*width
+    data = bytes(buffer[offset:end])
+    codes = [int.from_bytes(data[i:i+width], "little")
+             for i in range(0, len(data), width)]
+    return GameRecord(variant, (rowNum, colNum), result, codes), end
+
+def recordLength(buffer, offset):
+    nameLength = buffer[offset]
+    rowNum, colNum, result, plies = HEADER.unpack_from(buffer, offset+1+nameLength)
+    return 1 + nameLength + HEADER.size + plies*codeBytes((rowNum, colNum))
+
+class RecordWriter():
+    """
+        Appends games to a record file and their offsets to its index.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        elif not os.path.exists(path + INDEX_SUFFIX):
+            self.file.flush()
+            writeIndex(path, buildIndex(path))
+        self.index = open(path + INDEX_SUFFIX, "ab")
+
+    def write(self, record):
+        offsets = array("Q", [self.file.tell()])
+        self.file.write(record.pack())
+        self.index.write(offsets.tobytes())
+
+    def writeGame(self, game, winner=False):
+        self.write(GameRecord.fromGame(game, winner))
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def readRecords(path):
+    """
+        Yield every GameRecord of a record file, reading it sequentially.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a game record file: {}".format(path))
+        while True:
+            head = f.read(1)
+            if not head:
+                return
+            rest = f.read(head[0] + HEADER.size)
+            rowNum, colNum, result, plies = HEADER.unpack_from(rest, head[0])
+            data = head + rest + f.read(plies*codeBytes((rowNum, colNum)))
+            yield unpackRecord(data, 0)[0]
+
+def buildIndex(path):
+    """
+        The offsets of all games of a record file, found by skipping over
+        the move codes.
+    """
+    offsets = array("Q")
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = len(MAGIC)
+        while offset < len(buffer):
+            offsets.append(offset)
+            offset += recordLength(buffer, offset)
+        buffer.close()
+    return offsets
+
+def writeIndex(path, offsets):
+    with open(path + INDEX_SUFFIX, "wb") as f:
+        f.write(offsets.tobytes())
+
+class RecordArchive():
+    """
+        Random access to the games of a record file by number through mmap.
+        The index file is rebuilt when it is missing or out of date.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if bytes(self.buffer[:len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ValueError("Not a game record file: {}".format(path))
+
+        self.offsets = None
+        if os.path.exists(path + INDEX_SUFFIX):
+            with open(path + INDEX_SUFFIX, "rb") as f:
+                offsets = array("Q")
+                offsets.frombytes(f.read())
+            if not offsets or (offsets[-1] < size and
+                    offsets[-1] + recordLength(self.buffer, offsets[-1]) == size):
+                self.offsets = offsets
+        if self.offsets is None or (not self.offsets and size > len(MAGIC)):
+            self.offsets = buildIndex(path)
+            writeIndex(path, self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        return unpackRecord(self.buffer, self.offsets[index])[0]
+
+    def __iter__(self):
+        for offset in self.offsets:
+            yield unpackRecord(self.buffer, offset)[0]
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
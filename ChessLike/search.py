@@ -0,0 +1,257 @@
+import time
+
+from .base import CODE_CAPTURE
+
+WIN = 1000000
+MATE_BOUND = WIN - 1000
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+def mobility(game):
+    return len(game.legalMoveCodes())
+
+class TranspositionTable():
+    """
+        A fixed number of slots indexed by the low bits of the position hash.
+        A slot is only replaced by an entry searched at least as deep, or by
+        a newer entry for the same position, so the table never grows past
+        its budget.
+    """
+    def __init__(self, size=1<<18):
+        bits = max(size-1, 1).bit_length()
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.slots = [None] * self.size
+
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is None or entry[0] != key:
+            return None
+        return entry
+
+    def store(self, key, depth, score, flag, moveCode):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None or entry[0] == key or depth >= entry[1]:
+            self.slots[index] = (key, depth, score, flag, moveCode)
+
+    def clear(self):
+        self.slots = [None] * self.size
+
+class SearchResult():
+    def __init__(self, bestMove, score, depth, pv, nodes, elapsed):
+        self.bestMove = bestMove
+        self.score = score
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return "SearchResult(bestMove={}, score={}, depth={}, pv={}, nodes={})".format(
+                self.bestMove, self.score, self.depth,
+                [str(move) for move in self.pv], self.nodes)
+
+class SearchAborted(Exception):
+    pass
+
+class Searcher():
+    """
+        Negamax alpha-beta search with iterative deepening for any game with
+        the legalMoveCodes/decodeMove/push/pop/winner/hash interface 
+        (nPawnGame and kyotoShogiGame). Moves are handled as packed ints and 
+        only turned into Move objects when they are played.
+
+        eval(game) scores a quiet position from the side to move; wins are
+        scored WIN minus the distance in plies. Moves are ordered by the
+        transposition table move, captures, killer moves and the history
+        heuristic.
+
+        probe(game), if given, is asked below the root for an exact result 
+        (e.g. tablebase.probe): None, or (result, distance) with result 1, 
+        0 or -1 for the side to move and the distance to the end in plies.
+    """
+    def __init__(self, eval=None, ttSize=1<<18, probe=None):
+        if eval is None:
+            eval = mobility
+
+        self.eval = eval
+        self.probe = probe
+        self.tt = TranspositionTable(ttSize)
+        self.killers = {}
+        self.historyScores = {}
+        self.excluded = set()
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def search(self, game, depth=None, timeLimit=None, nodeLimit=None):
+        return self.searchLines(game, depth, timeLimit, nodeLimit)[0]
+
+    def searchLines(self, game, depth=None, timeLimit=None, nodeLimit=None, multiPV=1):
+        """
+            The multiPV best lines of game as SearchResults, best first. At 
+            every depth line k is searched with the first moves of the lines 
+            before it excluded at the root; the lines of the last completed 
+            depth are returned.
+        """
+        if depth is None:
+            depth = 64 if (timeLimit or nodeLimit) else 4
+
+        game = game.copy()
+        self.stopped = False
+        self.nodes = 0
+        self.nodeLimit = nodeLimit
+        self.startTime = time.time()
+        self.deadline = None if timeLimit is None else self.startTime + timeLimit
+        self.killers = {}
+
+        lines = []
+        for iterDepth in range(1, depth+1):
+            found = []
+            self.excluded = set()
+            try:
+                for index in range(multiPV):
+                    score, pv = self.negamax(game, iterDepth, -WIN-1, WIN+1, 0)
+                    if not pv:
+                        break
+                    self.excluded.add(pv[0])
+                    pv = [game.decodeMove(code) for code in pv]
+                    found.append(SearchResult(pv[0], score, iterDepth, pv,
+                                              self.nodes, time.time()-self.startTime))
+            except SearchAborted:
+                break
+            finally:
+                self.excluded = set()
+            lines = found
+            if not lines or all(abs(line.score) >= MATE_BOUND for line in lines):
+                break
+
+        if not lines:
+            moves = game.legalMoveCodes()
+            bestMove = game.decodeMove(moves[0]) if moves else None
+            lines = [SearchResult(bestMove, 0, 0, [bestMove] if moves else [],
+                                  self.nodes, time.time()-self.startTime)]
+        for line in lines:
+            line.nodes = self.nodes
+            line.elapsed = time.time()-self.startTime
+        return lines
+
+    def checkLimits(self):
+        if self.stopped:
+            raise SearchAborted()
+        if not (self.nodeLimit is None) and self.nodes >= self.nodeLimit:
+            raise SearchAborted()
+        if not (self.deadline is None) and time.time() >= self.deadline:
+            raise SearchAborted()
+
+    def negamax(self, game, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self.checkLimits()
+
+        winner = game.winner()
+        if not (winner is None):
+            if winner == game.currentColor:
+                return WIN - ply, []
+            return -(WIN - ply), []
+        if not (self.probe is None) and ply > 0:
+            found = self.probe(game)
+            if not (found is None):
+                result, distance = found
+                if result == 0:
+                    return 0, []
+                score = WIN - (ply + distance)
+                return (score if result > 0 else -score), []
+        if depth <= 0:
+            return self.eval(game), []
+
+        key = game.hash()
+        alphaOrig = alpha
+        ttMove = None
+        entry = self.tt.probe(key)
+        if not (entry is None):
+            ttMove = entry[4]
+            if entry[1] >= depth and ply > 0:
+                score = fromTT(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT:
+                    return score, []
+                if flag == LOWER and score >= beta:
+                    return score, []
+                if flag == UPPER and score <= alpha:
+                    return score, []
+
+        moves = self.orderMoves(game.legalMoveCodes(), ttMove, ply)
+        if ply == 0 and self.excluded:
+            moves = [move for move in moves if move not in self.excluded]
+
+        bestScore = -WIN-1
+        bestPV = []
+        for move in moves:
+            game.push(game.decodeMove(move))
+            try:
+                score, pv = self.negamax(game, depth-1, -beta, -alpha, ply+1)
+            finally:
+                game.pop()
+            score = -score
+
+            if score > bestScore:
+                bestScore = score
+                bestPV = [move] + pv
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if not (move & CODE_CAPTURE):
+                    killers = self.killers.setdefault(ply, [])
+                    if move not in killers:
+                        killers.insert(0, move)
+                        del killers[2:]
+                    self.historyScores[move] = self.historyScores.get(move, 0) + depth*depth
+                break
+
+        if bestScore <= alphaOrig:
+            flag = UPPER
+        elif bestScore >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if ply > 0 or not self.excluded:
+            self.tt.store(key, depth, toTT(bestScore, ply), flag,
+                          bestPV[0] if bestPV else None)
+        return bestScore, bestPV
+
+    def orderMoves(self, moves, ttMove, ply):
+        killers = self.killers.get(ply, [])
+        historyScores = self.historyScores
+
+        def priority(move):
+            if move == ttMove:
+                return (0, 0)
+            if move & CODE_CAPTURE:
+                return (1, 0)
+            if move in killers:
+                return (2, killers.index(move))
+            return (3, -historyScores.get(move, 0))
+
+        return sorted(moves, key=priority)
+
+def toTT(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def fromTT(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+def searchMove(game, depth=None, timeLimit=None, nodeLimit=None, eval=None):
+    return Searcher(eval=eval).search(game, depth, timeLimit, nodeLimit).bestMove
@@ -0,0 +1,327 @@
+from ..base import packMove, CODE_CAPTURE, CODE_PROMOTE, CODE_TYPE_SHIFT, CODE_SECOND
+from .kyotoShogi import WHITE, BLACK
+from .kyotoShogi import King, Move, PIECE_ID, PIECE_PROMOTE, STEP_TABLE, RAY_TABLE
+from .kyotoShogi import handTypes, BOARD_SIZE, START_CODE, END_CODE
+from .kyotoShogi import kyotoShogiGame
+
+SQUARES = [(x,y) for y in range(5) for x in range(5)]
+SQUARE_INDEX = {pos: index for index,pos in enumerate(SQUARES)}
+INDEX_END_CODE = [END_CODE[pos] for pos in SQUARES]
+ALL_SQUARES = (1 << len(SQUARES)) - 1
+
+def squareMask(squares):
+    mask = 0
+    for pos in squares:
+        mask |= 1 << SQUARE_INDEX[pos]
+    return mask
+
+STEP_MASK = {pieceKey: [squareMask(table[pos]) for pos in SQUARES]
+             for pieceKey, table in STEP_TABLE.items()}
+
+# Every ray is stored as (mask, ascending), where ascending tells whether
+# the square index grows along the ray; the first blocker is then the
+# lowest or the highest set bit of mask & occupied.
+RAY_MASK = {pieceKey: [tuple((squareMask(ray), SQUARE_INDEX[ray[0]] > index)
+                             for ray in table[pos])
+                       for index,pos in enumerate(SQUARES)]
+            for pieceKey, table in RAY_TABLE.items()}
+
+def betweenMasks():
+    """
+        The squares strictly between two squares on a common rank, file or
+        diagonal, keyed by the pair of square indices.
+    """
+    between = {}
+    for a, (ax,ay) in enumerate(SQUARES):
+        for b, (bx,by) in enumerate(SQUARES):
+            dx, dy = bx-ax, by-ay
+            if a == b or not (dx == 0 or dy == 0 or abs(dx) == abs(dy)):
+                continue
+            stepX, stepY = (dx > 0) - (dx < 0), (dy > 0) - (dy < 0)
+            squares = []
+            x, y = ax+stepX, ay+stepY
+            while (x,y) != (bx,by):
+                squares.append((x,y))
+                x, y = x+stepX, y+stepY
+            between[(a,b)] = squareMask(squares)
+    return between
+
+BETWEEN = betweenMasks()
+
+def rayAttacks(rays, occupied):
+    attacks = 0
+    for mask, ascending in rays:
+        blockers = mask & occupied
+        if not blockers:
+            attacks |= mask
+        elif ascending:
+            attacks |= mask & (((blockers & -blockers) << 1) - 1)
+        else:
+            attacks |= mask & -(1 << (blockers.bit_length()-1))
+    return attacks
+
+def bitSquares(mask):
+    while mask:
+        low = mask & -mask
+        yield SQUARES[low.bit_length()-1]
+        mask ^= low
+
+class BitboardKyotoShogi(kyotoShogiGame):
+    """
+        Kyoto shogi with the position also kept as one 25-bit integer per
+        piece type and color. Bit x+5*y stands for square (x,y).
+
+        Alongside the bitboards, the squares every piece attacks or defends
+        are kept as masks and updated by push/pop, so that king safety,
+        checks and pins come from a few mask operations. The generated
+        moves are the same Move objects kyotoShogiGame.legalMoves returns.
+    """
+    def __init__(self):
+        super().__init__()
+        self._bitboardBoard = None
+
+    def bitboards(self):
+        if self._bitboardBoard is not self.board:
+            self._bitboardBoard = self.board
+            self._bitboards = {pieceKey: 0 for pieceKey in STEP_MASK}
+            self._occupied = {WHITE: 0, BLACK: 0}
+            for pos in self.board:
+                piece = self.board[pos]
+                bit = 1 << SQUARE_INDEX[pos]
+                self._bitboards[(type(piece), piece.color)] |= bit
+                self._occupied[piece.color] |= bit
+            self._attackMasks = {}
+            self._updateMasks(ALL_SQUARES)
+        return self._bitboards, self._occupied
+
+    def refresh(self):
+        super().refresh()
+        self._bitboardBoard = None
+
+    def _updateMasks(self, changed):
+        """
+            Recompute the attack masks of the pieces on the changed squares
+            and of the sliders whose reach crosses them, then the union
+            guarded by each color.
+        """
+        board = self.board
+        masks = self._attackMasks
+        occupied = self._occupied[WHITE] | self._occupied[BLACK]
+
+        stale = [index for index in masks if masks[index][2] and masks[index][1] & changed]
+        while changed:
+            low = changed & -changed
+            stale.append(low.bit_length()-1)
+            changed ^= low
+
+        for index in stale:
+            piece = board.get(SQUARES[index])
+            if piece is None:
+                masks.pop(index, None)
+                continue
+            pieceKey = (type(piece), piece.color)
+            rays = RAY_MASK[pieceKey][index]
+            attacks = STEP_MASK[pieceKey][index]
+            if rays:
+                attacks |= rayAttacks(rays, occupied)
+            masks[index] = (piece.color, attacks, rays)
+
+        guarded = {WHITE: 0, BLACK: 0}
+        for color, attacks, rays in masks.values():
+            guarded[color] |= attacks
+        self._guarded = guarded
+
+    def kingSquare(self, color=None):
+        if color is None:
+            color = self.currentColor
+        bitboards, occupied = self.bitboards()
+
+        kings = bitboards[(King, color)]
+        if not kings:
+            return None
+        if not (kings & (kings-1)):
+            return SQUARES[kings.bit_length()-1]
+        # Several kings (one was dropped): the first in board order
+        for pos in self.board:
+            piece = self.board[pos]
+            if type(piece) == King and piece.color == color:
+                return pos
+
+    def isChecked(self):
+        pos = self.kingSquare()
+        if pos is None:
+            return False
+        return bool(self._guarded[self.otherColor(self.currentColor)] >> SQUARE_INDEX[pos] & 1)
+
+    def checkMasks(self):
+        """
+            checkInfo as masks: the squares a non-king move or a drop has to
+            end on to stop every check, and for every pinned piece (by
+            square index) the squares it may move to.
+        """
+        color = self.currentColor
+        other = self.otherColor(color)
+        bitboards, occupied = self.bitboards()
+        allOccupied = occupied[WHITE] | occupied[BLACK]
+        king = SQUARE_INDEX[self.kingSquare(color)]
+        kingBit = 1 << king
+
+        evasion = ALL_SQUARES
+        pins = {}
+        for index, (pieceColor, attacks, rays) in self._attackMasks.items():
+            if pieceColor != other:
+                continue
+            if attacks & kingBit:
+                evasion &= 1 << index | BETWEEN.get((index,king), 0)
+                continue
+            for mask, ascending in rays:
+                if not (mask & kingBit):
+                    continue
+                line = BETWEEN[(index,king)]
+                blockers = line & allOccupied
+                if not (blockers & (blockers-1)) and blockers & occupied[color]:
+                    pins[blockers.bit_length()-1] = 1 << index | line
+        return evasion, pins
+
+    def moveTargets(self, color=None):
+        """
+            (pos, piece, mask of destinations) for every piece of color and
+            the mask of the squares the side to move may drop on, with the
+            check evasion and king safety rules of legalMoves applied.
+        """
+        if color is None:
+            color = self.currentColor
+        other = self.otherColor(color)
+        bitboards, occupied = self.bitboards()
+        masks = self._attackMasks
+        own = occupied[color]
+        empty = ALL_SQUARES & ~(occupied[WHITE] | occupied[BLACK])
+
+        kingGuard = ALL_SQUARES
+        if color == self.currentColor:
+            kingGuard &= ~self._guarded[other]
+        evasion = ALL_SQUARES
+        pins = None
+        if self.isChecked():
+            evasion, pins = self.checkMasks()
+            empty &= evasion
+
+        pieces = []
+        for pos, piece in self.board.items():
+            if piece.color != color:
+                continue
+            index = SQUARE_INDEX[pos]
+            targets = masks[index][1] & ~own
+            if type(piece) == King:
+                targets &= kingGuard
+            elif not (pins is None):
+                targets &= evasion
+                if index in pins:
+                    targets &= pins[index]
+            if targets:
+                pieces.append((pos, piece, targets))
+        return pieces, empty
+
+    def legalMoves(self, color=None):
+        pieces, empty = self.moveTargets(color)
+        board = self.board
+
+        moves = []
+        for pos, piece, targets in pieces:
+            promotes = not (PIECE_PROMOTE[type(piece)] is None)
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                end = SQUARES[low.bit_length()-1]
+                capture = end in board
+                moves.append(Move(piece,pos, end, capture=capture))
+                if promotes:
+                    moves.append(Move(piece,pos, end, capture=capture, promote=True))
+
+        if empty:
+            squares = list(bitSquares(empty))
+            for pieceType in handTypes(self.captured[self.currentColor]):
+                piece = pieceType(self.currentColor, pieceType)
+                for target in squares:
+                    moves.append(Move(piece,PIECE_ID[pieceType],target,drop=True))
+        return moves
+
+    def legalMoveCodes(self, color=None):
+        if color is None:
+            color = self.currentColor
+        pieces, empty = self.moveTargets(color)
+        enemies = self._occupied[self.otherColor(color)]
+        colorBits = CODE_SECOND if color == BLACK else 0
+
+        codes = []
+        for pos, piece, targets in pieces:
+            base = START_CODE[pos] | PIECE_ID[type(piece)] << CODE_TYPE_SHIFT | colorBits
+            promotes = not (PIECE_PROMOTE[type(piece)] is None)
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                code = base | INDEX_END_CODE[low.bit_length()-1]
+                if low & enemies:
+                    code |= CODE_CAPTURE
+                codes.append(code)
+                if promotes:
+                    codes.append(code | CODE_PROMOTE)
+
+        if empty:
+            ends = [END_CODE[pos] for pos in bitSquares(empty)]
+            for pieceType in handTypes(self.captured[self.currentColor]):
+                pieceId = PIECE_ID[pieceType]
+                base = packMove(pieceId, (0,0), pieceId, self.currentColor == BLACK, 
+                                BOARD_SIZE, drop=True)
+                for end in ends:
+                    codes.append(base | end)
+        return codes
+
+    def isValid(self, move):
+        pieces, empty = self.moveTargets()
+        endBit = 1 << SQUARE_INDEX[move.end]
+        pieceType = type(move.piece)
+        if move.drop:
+            return ( move.piece.color == self.currentColor and bool(empty & endBit)
+                and  pieceType in self.captured[self.currentColor] )
+        for pos, piece, targets in pieces:
+            if pos == move.start:
+                return ( type(piece) == pieceType and piece.color == move.piece.color 
+                    and  bool(targets & endBit) )
+        return False
+
+    def hasLegalMove(self, color=None):
+        pieces, empty = self.moveTargets(color)
+        return bool(pieces) or (bool(empty) and bool(self.captured[self.currentColor]))
+
+    def push(self, move):
+        super().push(move)
+        if self._bitboardBoard is self.board:
+            move, piece, taken = self.history[-1]
+            self._toggle(move, piece, taken, self.board[move.end])
+
+    def pop(self):
+        if self._bitboardBoard is not self.board:
+            return super().pop()
+        move, piece, taken = self.history[-1]
+        moved = self.board[move.end]
+        super().pop()
+        self._toggle(move, piece, taken, moved)
+        return move
+
+    def _toggle(self, move, piece, taken, moved):
+        bitboards, occupied = self._bitboards, self._occupied
+        endBit = 1 << SQUARE_INDEX[move.end]
+        changed = endBit
+
+        if not move.drop:
+            startBit = 1 << SQUARE_INDEX[move.start]
+            bitboards[(type(piece), piece.color)] ^= startBit
+            occupied[piece.color] ^= startBit
+            changed |= startBit
+        if not (taken is None):
+            bitboards[(type(taken), taken.color)] ^= endBit
+            occupied[taken.color] ^= endBit
+        bitboards[(type(moved), moved.color)] ^= endBit
+        occupied[moved.color] ^= endBit
+        self._updateMasks(changed)
@@ -1,231 +1,87 @@
 import copy
 from ..base import Piece
 from ..base import Move as BaseMove
-from ..rect import posAdd, posMult
+from ..base import packMove, unpackMove, packSquare, squareBits
+from ..base import CODE_CAPTURE, CODE_PROMOTE, CODE_KEY_MASK, CODE_SQUARE_SHIFT
+from ..base import CODE_TYPE_SHIFT, CODE_SECOND
+from ..movement import PieceMovement, moveTable, destinations
+from ..zobrist import ZOBRIST
 
 WHITE = "white"
 BLACK = "black"
 
 class ShogiPiece(Piece):
+    __slots__ = ("original",)
+
     def __init__(self, color, original):
         pieceType = type(self)
         self.color = color
         self.symbol = PIECE_SYMBOL[pieceType].lower() if color == BLACK else PIECE_SYMBOL[pieceType].upper()
         self.name = PIECE_NAME[pieceType]
         self.original = original
-        
 
-class King(ShogiPiece):
     def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
+        guard = kargs.get("guard", False)
         color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
+        movement = PIECE_MOVEMENT[type(self)]
+        entry = moveTable(movement, game.size, FORWARD[color])[pos]
 
         moves = []
-        for dy in [-1,0,1]:
-            for dx in [-1,0,1]:
-                if dx == 0 and dy == 0:
-                    continue
-                end = xx, yy = x+dx, y+dy
-                if self.noConflict(end, game, color) or guard:
-                    p = game.board.get(end)
-                    capture = not(p is None)
-                    if color == game.currentColor:
-                        if not game.isAttacked(end,guard=True):
-                            moves.append(Move(self,pos, end, capture=capture))
-                    else:
-                        moves.append(Move(self,pos, end, capture=capture))
-
-        return moves
-
-class Pawn(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
-
-        moves = []
-        end = xx, yy = x, y+direction
-        if self.noConflict(end, game, color) or guard:
-            capture = not(game.board.get(end) is None)
+        for end, capture in destinations(entry, game.board, color, guard):
             moves.append(Move(self,pos, end, capture=capture))
-            moves.append(Move(self,pos, end, capture=capture, promote=True))
-
+            if not (movement.promote is None):
+                moves.append(Move(self,pos, end, capture=capture, promote=True))
         return moves
 
-class Rook(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
-
-        moves = []
-        for dd in [(0,1),(1,0),(0,-1),(-1,0)]:
-            end = posAdd(pos,dd)
-            while (end not in game.board) and (game.isInBounds(end)):
-                moves.append(Move(self,pos, end))
-                moves.append(Move(self,pos, end, promote=True))
-                end = posAdd(end,dd)
-            if self.noConflict(end, game, color) or guard:
-                capture = not(game.board.get(end) is None)
-                moves.append(Move(self,pos, end, capture=capture))
-                moves.append(Move(self,pos, end, capture=capture, promote=True))
+class King(ShogiPiece):
+    __slots__ = ()
 
+    def legalMoves(self, pos, game, *args, **kargs):
+        moves = ShogiPiece.legalMoves(self, pos, game, *args, **kargs)
+        if self.color == game.currentColor:
+            moves = [m for m in moves if not game.isAttacked(m.end, guard=True)]
         return moves
 
-class Silver(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
+class Pawn(ShogiPiece):
+    __slots__ = ()
 
-        moves = []
-        for dd in [(1,1),(0,1),(-1,1),(1,-1),(-1,-1)]:
-            end = posAdd(pos,posMult(dd,direction))
-            if self.noConflict(end, game, color) or guard:
-                capture = not(game.board.get(end) is None)
-                moves.append(Move(self,pos, end, capture=capture))
-                moves.append(Move(self,pos, end, capture=capture, promote=True))
+class Rook(ShogiPiece):
+    __slots__ = ()
 
-        return moves
+class Silver(ShogiPiece):
+    __slots__ = ()
 
 class Bishop(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
-
-        moves = []
-        for dd in [(1,1),(1,-1),(-1,-1),(-1,1)]:
-            end = posAdd(pos,dd)
-            while (end not in game.board) and (game.isInBounds(end)):
-                moves.append(Move(self,pos, end))
-                moves.append(Move(self,pos, end, promote=True))
-                end = posAdd(end,dd)
-            if self.noConflict(end, game, color) or guard:
-                capture = not(game.board.get(end) is None)
-                moves.append(Move(self,pos, end, capture=capture))
-                moves.append(Move(self,pos, end, capture=capture, promote=True))
-
-        return moves
+    __slots__ = ()
 
 class Gold(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
-
-        moves = []
-        for dd in [(1,1),(0,1),(-1,1),(1,0),(-1,0),(0,-1)]:
-            end = posAdd(pos,posMult(dd,direction))
-            if self.noConflict(end, game, color) or guard:
-                capture = not(game.board.get(end) is None)
-                moves.append(Move(self,pos, end, capture=capture))
-                moves.append(Move(self,pos, end, capture=capture, promote=True))
-
-        return moves
+    __slots__ = ()
 
 class Knight(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
-
-        moves = []
-        for dd in [(1,2),(-1,2)]:
-            end = posAdd(pos,posMult(dd,direction))
-            if self.noConflict(end, game, color) or guard:
-                capture = not(game.board.get(end) is None)
-                moves.append(Move(self,pos, end, capture=capture))
-                moves.append(Move(self,pos, end, capture=capture, promote=True))
-
-        return moves
+    __slots__ = ()
 
 class Lance(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
-
-        moves = []
-        end = posAdd(pos,(0,direction))
-        while (end not in game.board) and (game.isInBounds(end)):
-            moves.append(Move(self,pos, end))
-            moves.append(Move(self,pos, end, promote=True))
-            end = posAdd(end,(0,direction))
-        if self.noConflict(end, game, color) or guard:
-            capture = not(game.board.get(end) is None)
-            moves.append(Move(self,pos, end, capture=capture))
-            moves.append(Move(self,pos, end, capture=capture, promote=True))
-
-        return moves
+    __slots__ = ()
 
 class Tokin(ShogiPiece):
-    def legalMoves(self, pos, game, *args, **kargs):
-        if not ("guard" in kargs):
-            guard = False
-        else:
-            guard = kargs["guard"]
-        color = self.color
-        x, y = pos
-        board = game.board
-        direction = -1 if color == WHITE else 1
+    __slots__ = ()
 
-        moves = []
-        for dd in [(1,1),(0,1),(-1,1),(1,0),(-1,0),(0,-1)]:
-            end = posAdd(pos,posMult(dd,direction))
-            if self.noConflict(end, game, color) or guard:
-                capture = not(game.board.get(end) is None)
-                moves.append(Move(self,pos, end, capture=capture))
-                moves.append(Move(self,pos, end, capture=capture, promote=True))
+GOLD_STEPS = [(1,1),(0,1),(-1,1),(1,0),(-1,0),(0,-1)]
 
-        return moves
+PIECE_MOVEMENT = {King  : PieceMovement(steps=[(1,1),(0,1),(-1,1),(1,0),(-1,0),(1,-1),(0,-1),(-1,-1)]),
+                  Tokin : PieceMovement(steps=GOLD_STEPS, promote=Lance),
+                  Lance : PieceMovement(slides=[(0,1)], promote=Tokin),
+                  Silver: PieceMovement(steps=[(1,1),(0,1),(-1,1),(1,-1),(-1,-1)], promote=Bishop),
+                  Bishop: PieceMovement(slides=[(1,1),(1,-1),(-1,-1),(-1,1)], promote=Silver),
+                  Gold  : PieceMovement(steps=GOLD_STEPS, promote=Knight),
+                  Knight: PieceMovement(steps=[(1,2),(-1,2)], promote=Gold),
+                  Pawn  : PieceMovement(steps=[(0,1)], promote=Rook),
+                  Rook  : PieceMovement(slides=[(0,1),(1,0),(0,-1),(-1,0)], promote=Pawn)}
 
-PIECE_PROMOTE = {King  : None  , 
-                 Tokin : Lance , Lance : Tokin ,
-                 Silver: Bishop, Bishop: Silver,
-                 Gold  : Knight, Knight: Gold  ,
-                 Pawn  : Rook  , Rook  : Pawn  }
+# Pieces of each color move toward this side of the board
+FORWARD = {WHITE: -1, BLACK: 1}
+
+PIECE_PROMOTE = {pieceType: movement.promote for pieceType, movement in PIECE_MOVEMENT.items()}
 
 PIECE_SYMBOL = {King  : "K", 
                 Tokin : "T", Lance : "L",
@@ -239,13 +95,158 @@ PIECE_NAME = {King  : "King"  ,
               Gold  : "Gold"  , Knight: "Knight",
               Pawn  : "Pawn"  , Rook  : "Rook"  }
 
+PIECE_ID = {King  : 0, 
+            Tokin : 1, Lance : 2,
+            Silver: 3, Bishop: 4,
+            Gold  : 5, Knight: 6,
+            Pawn  : 7, Rook  : 8}
+
+PIECE_TYPES = {pieceId: pieceType for pieceType, pieceId in PIECE_ID.items()}
+
 PIECE_SYMBOL_KANJI = {King  : "玉", 
                       Tokin : "と", Lance : "香",
                       Silver: "銀", Bishop: "角",
                       Gold  : "金", Knight: "桂",
                       Pawn  : "歩", Rook  : "飛"}
 
+def buildMoveTables(size):
+    """
+        The squares reached by single steps and the rays followed by sliding 
+        moves of every piece type, keyed by (pieceType, color) and then by 
+        square.
+    """
+    steps = {}
+    rays = {}
+    for pieceType, movement in PIECE_MOVEMENT.items():
+        for color in [WHITE, BLACK]:
+            table = moveTable(movement, size, FORWARD[color])
+            steps[(pieceType, color)] = {pos: table[pos][0] for pos in table}
+            rays[(pieceType, color)] = {pos: table[pos][1] for pos in table}
+    return steps, rays
+
+BOARD_SIZE = (5,5)
+
+STEP_TABLE, RAY_TABLE = buildMoveTables(BOARD_SIZE)
+
+# The start and end square of a move, as ORed into a move code
+START_CODE = {(x,y): packSquare((x,y), BOARD_SIZE) << CODE_SQUARE_SHIFT
+              for y in range(BOARD_SIZE[0]) for x in range(BOARD_SIZE[1])}
+END_CODE = {pos: code << squareBits(BOARD_SIZE) for pos, code in START_CODE.items()}
+
+def attackReach(piece, pos, board):
+    """
+        The squares a piece on pos defends or attacks, i.e. its destinations 
+        when moving onto its own pieces is allowed (guard=True).
+    """
+    pieceKey = (type(piece), piece.color)
+    squares = STEP_TABLE[pieceKey][pos]
+    for ray in RAY_TABLE[pieceKey][pos]:
+        for end in ray:
+            squares += (end,)
+            if end in board:
+                break
+    return squares
+
+def pieceKey(pos, piece):
+    return ZOBRIST[(pos, str(piece), PIECE_SYMBOL[piece.original])]
+
+def handKey(color, pieceType, count):
+    if count == 0:
+        return 0
+    return ZOBRIST[("hand", color, PIECE_SYMBOL[pieceType], count)]
+
+def handTypes(hand):
+    """
+        The piece types of a hand (a dict from piece type to count) in 
+        PIECE_ID order.
+    """
+    return [pieceType for pieceType in PIECE_ID if pieceType in hand]
+
+def handPieces(hand, color):
+    return [pieceType(color, pieceType) for pieceType in handTypes(hand)
+            for n in range(hand[pieceType])]
+
+# FEN tokens: the piece letter, upper case for white, with a "+" in front
+# when the piece's original type is its promotion partner
+FEN_PIECES = {}
+for pieceType, symbol in PIECE_SYMBOL.items():
+    for color in [WHITE, BLACK]:
+        letter = symbol.upper() if color == WHITE else symbol.lower()
+        FEN_PIECES[letter] = pieceType(color, pieceType)
+        if not (PIECE_PROMOTE[pieceType] is None):
+            FEN_PIECES["+"+letter] = pieceType(color, PIECE_PROMOTE[pieceType])
+FEN_COLOR = {WHITE: "w", BLACK: "b"}
+FEN_COLOR_NAME = {"w": WHITE, "b": BLACK}
+_fenRanks = {}
+_fenHands = {}
+_fenTemplates = {}
+
+def fenToken(piece):
+    pieceType = type(piece)
+    if piece.original is pieceType:
+        return piece.symbol
+    if piece.original is PIECE_PROMOTE[pieceType]:
+        return "+" + piece.symbol
+    raise ValueError("{} with original {} has no FEN token".format(
+            repr(piece), piece.original.__name__))
+
+def fenRank(rank, colNum):
+    """
+        The (x, piece) pairs of a rank of a FEN board, read from x = colNum-1
+        down to 0. Ranks are cached since few distinct ones occur.
+    """
+    key = (rank, colNum)
+    pieces = _fenRanks.get(key)
+    if pieces is None:
+        pieces = []
+        x = colNum-1
+        empty = 0
+        index = 0
+        while index < len(rank):
+            char = rank[index]
+            if char.isdigit():
+                empty = empty*10 + int(char)
+                index += 1
+                continue
+            x -= empty
+            empty = 0
+            token = rank[index:index+2] if char == "+" else char
+            if token not in FEN_PIECES:
+                raise ValueError("Invalid FEN rank: {}".format(rank))
+            pieces.append((x, FEN_PIECES[token]))
+            x -= 1
+            index += len(token)
+        if x - empty != -1:
+            raise ValueError("FEN rank {} does not have {} squares".format(rank, colNum))
+        pieces = tuple(pieces)
+        _fenRanks[key] = pieces
+    return pieces
+
+def fenHand(hand):
+    """
+        (color, pieceType, count) for the hands field of a FEN, where a 
+        number in front of a piece letter is its count.
+    """
+    pieces = _fenHands.get(hand)
+    if pieces is None:
+        pieces = []
+        count = 0
+        for char in (hand if hand != "-" else ""):
+            if char.isdigit():
+                count = count*10 + int(char)
+                continue
+            if char not in FEN_PIECES:
+                raise ValueError("Invalid FEN hand: {}".format(hand))
+            piece = FEN_PIECES[char]
+            pieces.append((piece.color, type(piece), max(count, 1)))
+            count = 0
+        pieces = tuple(pieces)
+        _fenHands[hand] = pieces
+    return pieces
+
 class Move(BaseMove):
+    __slots__ = ("capture", "promote", "drop")
+
     def __init__(self, piece, start, end, capture=False, promote=False, drop=False):
         self.piece = piece
         self.start = start
@@ -254,6 +255,10 @@ class Move(BaseMove):
         self.promote = promote
         self.drop = drop
 
+    def code(self):
+        return packMove(self.start, self.end, PIECE_ID[type(self.piece)],
+                        self.piece.color == BLACK, BOARD_SIZE, self.capture, self.promote, self.drop)
+
     def longAlgebraicNotation(self):
         pieceName = str(self.piece).upper()
         if not self.drop:
@@ -280,6 +285,31 @@ class Move(BaseMove):
     def __str__(self):
         return self.longAlgebraicNotation()
 
+def isEvasion(start, end, checks, pins):
+    """
+        Whether a non-king move from start to end stops every check and 
+        does not uncover the king (see kyotoShogiGame.checkInfo).
+    """
+    for squares in checks.values():
+        if end not in squares:
+            return False
+    return start not in pins or end in pins[start]
+
+def evasionSquares(checks):
+    """
+        The squares on which a dropped piece stops every check.
+    """
+    squares = None
+    for blocking in checks.values():
+        squares = set(blocking) if squares is None else squares & set(blocking)
+    return squares if not (squares is None) else set()
+
+def decodeMove(code):
+    start, end, pieceId, second, capture, promote, drop = unpackMove(code, BOARD_SIZE)
+    pieceType = PIECE_TYPES[pieceId]
+    piece = pieceType(BLACK if second else WHITE, pieceType)
+    return Move(piece, start, end, capture=capture, promote=promote, drop=drop)
+
 class kyotoShogiGame():
     """
         The coordinate is as follows: 
@@ -288,11 +318,17 @@ class kyotoShogiGame():
             |           |
         (c-1,r-1) - ( 0 ,r-1) WHITE
     """
+    # winner() is decided by whether the side to move has a legal move
+    decidedByMoves = True
+
     def __init__(self): 
-        self.size = (5,5)
+        self.size = BOARD_SIZE
         self.currentColor = WHITE
         self.board = {}
-        self.captured = {WHITE:[], BLACK:[]}
+        self.captured = {WHITE:{}, BLACK:{}}
+        self.history = []
+        self._attackBoard = None
+        self._hash = None
 
         rowNum, colNum = self.size
         placement = [Tokin, Silver, King, Gold, Pawn]
@@ -315,8 +351,8 @@ class kyotoShogiGame():
                     item = self.board.get((col,row),".")
                     print(" "+str(item), end="")
                 print("|"+str(row+1))
-            print("B: "+str(self.captured[BLACK]))
-            print("W: "+str(self.captured[WHITE]))
+            print("B: "+str(handPieces(self.captured[BLACK], BLACK)))
+            print("W: "+str(handPieces(self.captured[WHITE], WHITE)))
         elif style == "kanji":
             for row in range(rowNum):
                 for col in range(colNum)[::-1]:
@@ -329,8 +365,8 @@ class kyotoShogiGame():
                     print(direction+kanji+" ", end="")
                 # print("|"+str(row+1))
                 print()
-            print("B: "+str(self.captured[BLACK]))
-            print("W: "+str(self.captured[WHITE]))
+            print("B: "+str(handPieces(self.captured[BLACK], BLACK)))
+            print("W: "+str(handPieces(self.captured[WHITE], WHITE)))
 
     def isInBounds(self, pos):
         x, y = pos
@@ -339,78 +375,323 @@ class kyotoShogiGame():
         return (0 <= x < colNum) and (0 <= y < rowNum) 
 
     def legalMoves(self, color=None):
+        return list(self.iterLegalMoves(color))
+
+    def iterLegalMoves(self, color=None, captures=False):
+        """
+            Generate the legal moves one at a time, in the order of 
+            legalMoves; with captures set only captures (no drops). Moves 
+            may be pushed and popped while iterating.
+        """
         if color is None:
             color = self.currentColor
         rowNum, colNum = self.size
 
-        moves = []
-        if not self.isChecked():
+        checks = pins = None
+        if self.isChecked():
+            checks, pins = self.checkInfo()
+        for pos, piece in list(self.board.items()):
+            if piece.color != color:
+                continue
+            for m in piece.legalMoves(pos, self):
+                if captures and not m.capture:
+                    continue
+                if ( checks is None or type(piece) == King 
+                        or isEvasion(pos, m.end, checks, pins) ):
+                    yield m
+        if captures:
+            return
+
+        targets = None if checks is None else evasionSquares(checks)
+        for pieceType in handTypes(self.captured[self.currentColor]):
+            piece = pieceType(self.currentColor, pieceType)
+            for y in range(rowNum):
+                for x in range(colNum):
+                    target = (x,y)
+                    if target not in self.board and (targets is None or target in targets):
+                        yield Move(piece,PIECE_ID[pieceType],target,drop=True)
+
+    def hasLegalMove(self, color=None):
+        if color is None:
+            color = self.currentColor
+        rowNum, colNum = self.size
+        if ( color == self.currentColor and self.captured[color] 
+                and len(self.board) < rowNum*colNum and not self.isChecked() ):
+            return True
+        for move in self.iterLegalMoves(color):
+            return True
+        return False
+
+    def iterAttacks(self, color=None):
+        """
+            Generate (square, target) for every square a piece of color 
+            attacks or defends, without building moves.
+        """
+        if color is None:
+            color = self.currentColor
+        board = self.board
+        for pos, piece in list(board.items()):
+            if piece.color == color:
+                for target in attackReach(piece, pos, board):
+                    yield pos, target
+
+    def checkInfo(self):
+        """
+            What a move other than a king move has to respect while the side 
+            to move is in check, computed once per position. 
+            checks maps the square of every piece giving check to the squares 
+            that stop it: its own square, plus for a slider the squares 
+            between it and the king. pins maps the square of every piece 
+            that alone shields the king from an enemy slider to the squares 
+            it may move to (the line between that slider and the king, the 
+            slider's square included).
+        """
+        color = self.currentColor
+        other = self.otherColor(color)
+        kingPos = self.kingSquare(color)
+        board = self.board
+
+        checks = {}
+        pins = {}
+        for pos in board:
+            piece = board[pos]
+            if piece.color != other:
+                continue
+            pieceKey = (type(piece), other)
+            if kingPos in STEP_TABLE[pieceKey][pos]:
+                checks[pos] = (pos,)
+            for ray in RAY_TABLE[pieceKey][pos]:
+                if kingPos not in ray:
+                    continue
+                line = ray[:ray.index(kingPos)]
+                blockers = [square for square in line if square in board]
+                if not blockers:
+                    checks[pos] = (pos,) + line
+                elif len(blockers) == 1 and board[blockers[0]].color == color:
+                    pins[blockers[0]] = (pos,) + line
+        return checks, pins
+
+    def attackMaps(self):
+        """
+            Per color tables of how many pieces attack each square, counted 
+            with guard=True (squares held by the attacker's own pieces 
+            included). Kings are counted a second time on their own so that 
+            the king-safety filter of King.legalMoves can be applied. 
+            The tables are built on first use and then updated by push/pop; 
+            call refresh() after editing board or captured directly.
+        """
+        if self._attackBoard is not self.board:
+            self._attackBoard = self.board
+            self._attacks = {WHITE: {}, BLACK: {}}
+            self._kingAttacks = {WHITE: {}, BLACK: {}}
+            self._kings = {WHITE: [], BLACK: []}
+            self._reach = {}
+            self._updateAttacks(list(self.board))
+        return self._attacks, self._kingAttacks
+
+    def _updateAttacks(self, changed):
+        board = self.board
+        reach = self._reach
+
+        stale = set(changed)
+        for pos in reach:
+            color, pieceType, squares = reach[pos]
+            if PIECE_MOVEMENT[pieceType].slides and pos not in stale:
+                for square in changed:
+                    if square in squares:
+                        stale.add(pos)
+                        break
+
+        for pos in stale:
+            old = reach.pop(pos, None)
+            if not (old is None):
+                color, pieceType, squares = old
+                attacks = self._attacks[color]
+                for square in squares:
+                    attacks[square] -= 1
+                if pieceType == King:
+                    kingAttacks = self._kingAttacks[color]
+                    for square in squares:
+                        kingAttacks[square] -= 1
+                    self._kings[color].remove(pos)
+
+            piece = board.get(pos)
+            if not (piece is None):
+                color, pieceType = piece.color, type(piece)
+                squares = attackReach(piece, pos, board)
+                reach[pos] = (color, pieceType, squares)
+                attacks = self._attacks[color]
+                for square in squares:
+                    attacks[square] = attacks.get(square, 0) + 1
+                if pieceType == King:
+                    kingAttacks = self._kingAttacks[color]
+                    for square in squares:
+                        kingAttacks[square] = kingAttacks.get(square, 0) + 1
+                    self._kings[color].append(pos)
+
+    def refresh(self):
+        """
+            Drop incrementally maintained state so that it is rebuilt from 
+            board and captured on next use.
+        """
+        self._attackBoard = None
+        self._hash = None
+
+    def hash(self):
+        """
+            64-bit Zobrist key of the position: board squares, side to move 
+            and the number of pieces of each type in both hands. 
+            It is kept up to date by push/pop.
+        """
+        if self._hash is None:
+            key = ZOBRIST[("side", self.currentColor)]
             for pos in self.board:
-                piece = self.board[pos]
-                if piece.color == color:
-                    pMoves = piece.legalMoves(pos, self)
-                    moves += pMoves
-            for index,piece in enumerate(self.captured[self.currentColor]):
-                for y in range(rowNum):
-                    for x in range(colNum):
-                        target = (x,y)
-                        if target not in self.board:
-                            moves.append(Move(piece,index,target,drop=True))
+                key ^= pieceKey(pos, self.board[pos])
+            for color in [WHITE, BLACK]:
+                hand = self.captured[color]
+                for pieceType in hand:
+                    key ^= handKey(color, pieceType, hand[pieceType])
+            self._hash = key
+        return self._hash
+
+    def _hashDelta(self, move, piece, taken, moved, color):
+        delta = ZOBRIST[("side", WHITE)] ^ ZOBRIST[("side", BLACK)]
+        hand = self.captured[color]
+        if not move.drop:
+            delta ^= pieceKey(move.start, piece) ^ pieceKey(move.end, moved)
+            if not (taken is None):
+                delta ^= pieceKey(move.end, taken)
+            if move.capture:
+                pieceType = taken.original
+                count = hand.get(pieceType, 0)
+                delta ^= handKey(color, pieceType, count) ^ handKey(color, pieceType, count-1)
         else:
-            attackers = self.checkedBy()
-            for pos in self.board:
-                piece = self.board[pos]
-                if piece.color == color:
-                    if type(piece) == King:
-                        pMoves = piece.legalMoves(pos, self)
-                        moves += pMoves
-                    else:
-                        pMoves = piece.legalMoves(pos, self)
-                        for m in pMoves:
-                            after = self.peek(m, moveCheck = False)
-                            after.currentColor = self.currentColor
-                            if not after.isChecked():
-                                moves.append(m)
-            for index,piece in enumerate(self.captured[self.currentColor]):
-                for y in range(rowNum):
-                    for x in range(colNum):
-                        target = (x,y)
-                        if target not in self.board:
-                            m = Move(piece,index,target,drop=True)
-                            after = self.peek(m, moveCheck = False)
-                            after.currentColor = self.currentColor
-                            if not after.isChecked():
-                                moves.append(m)
-        return moves
+            pieceType = type(piece)
+            count = hand.get(pieceType, 0)
+            delta ^= pieceKey(move.end, piece)
+            delta ^= handKey(color, pieceType, count) ^ handKey(color, pieceType, count+1)
+        return delta
+
+    def positionKey(self):
+        board = {pos: (str(piece), PIECE_SYMBOL[piece.original])
+                 for pos, piece in self.board.items()}
+        hands = {color: dict(self.captured[color]) for color in [WHITE, BLACK]}
+        return (self.currentColor, board, hands)
+
+    def toFEN(self):
+        """
+            SFEN-like text of the position: the ranks from row 0 with the 
+            files from colNum-1 to 0 (as printBoard shows them), the side to 
+            move ("w" or "b") and both hands, white first, as piece letters 
+            in PIECE_ID order with counts above one in front (e.g. "2Pg"). 
+            The initial position is "pgkst/5/5/5/TSKGP w -".
+        """
+        rowNum, colNum = self.size
+        ranks = []
+        for y in range(rowNum):
+            rank = ""
+            empty = 0
+            for x in range(colNum-1, -1, -1):
+                piece = self.board.get((x,y))
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += fenToken(piece)
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        hand = ""
+        for color in [WHITE, BLACK]:
+            pieces = self.captured[color]
+            for pieceType in handTypes(pieces):
+                count = pieces[pieceType]
+                hand += (str(count) if count > 1 else "") + pieceType(color, pieceType).symbol
+        return "{} {} {}".format("/".join(ranks), FEN_COLOR[self.currentColor], hand or "-")
+
+    @classmethod
+    def fromFEN(cls, fen):
+        """
+            The position of a toFEN() string, with an empty history.
+        """
+        template = _fenTemplates.get(cls)
+        if template is None:
+            template = _fenTemplates[cls] = cls()
+        fields = fen.split()
+        if len(fields) != 3 or fields[1] not in FEN_COLOR_NAME:
+            raise ValueError("Invalid FEN: {}".format(fen))
+        ranks = fields[0].split("/")
+        rowNum, colNum = template.size
+        if len(ranks) != rowNum:
+            raise ValueError("FEN board {} does not have {} ranks".format(fields[0], rowNum))
+
+        board = {}
+        for y, rank in enumerate(ranks):
+            for x, piece in fenRank(rank, colNum):
+                board[(x,y)] = piece
+        captured = {WHITE: {}, BLACK: {}}
+        for color, pieceType, count in fenHand(fields[2]):
+            captured[color][pieceType] = captured[color].get(pieceType, 0) + count
+
+        # Cheaper than copy.copy(template)
+        game = cls.__new__(cls)
+        game.__dict__.update(template.__dict__)
+        game.board = board
+        game.captured = captured
+        game.currentColor = FEN_COLOR_NAME[fields[1]]
+        game.history = []
+        game.refresh()
+        return game
+
+    def __hash__(self):
+        return self.hash()
+
+    def __eq__(self, that):
+        if not isinstance(that, kyotoShogiGame):
+            return NotImplemented
+        return ( self.hash() == that.hash()
+            and  self.positionKey() == that.positionKey() )
 
     def isAttacked(self, target, color=None, guard=False):
         if color is None:
             color = self.currentColor
         other = self.otherColor(color)
-        tester = copy.deepcopy(self)
-        tester.board[target] = Pawn(color, Pawn)
-
-        for pos in tester.board:
-            piece = tester.board[pos]
-            if piece.color == other:
-                move = Move(piece,pos,target)
-                if piece.isValid(move, self, guard=guard):
-                    return True
-        return False
+        attacks, kingAttacks = self.attackMaps()
+
+        count = attacks[other].get(target, 0)
+        if count == 0:
+            return False
+        if not guard:
+            piece = self.board.get(target)
+            if not (piece is None) and piece.color == other:
+                return False
+        # Kings of the side to move may not step onto guarded squares
+        if other == self.currentColor and attacks[color].get(target, 0):
+            count -= kingAttacks[other].get(target, 0)
+        return count > 0
 
     def attackedBy(self, target, color=None, guard=False):
         if color is None:
             color = self.currentColor
         other = self.otherColor(color)
-        tester = copy.deepcopy(self)
-        tester.board[target] = Pawn(color, Pawn)
+        attacks, kingAttacks = self.attackMaps()
 
         attackers = {}
-        for pos in tester.board:
-            piece = tester.board[pos]
-            if piece.color == other:
-                move = Move(piece,pos,target)
-                if piece.isValid(move, self, guard=guard):
+        if attacks[other].get(target, 0) == 0:
+            return attackers
+        if not guard:
+            piece = self.board.get(target)
+            if not (piece is None) and piece.color == other:
+                return attackers
+        kingSafe = not (other == self.currentColor and attacks[color].get(target, 0))
+
+        for pos in self.board:
+            piece = self.board[pos]
+            if piece.color == other and target in self._reach[pos][2]:
+                if type(piece) != King or kingSafe:
                     attackers[pos] = piece
         return attackers
 
@@ -424,25 +705,93 @@ class kyotoShogiGame():
                     cells.append((x,y))
         return cells
 
+    def legalMoveCodes(self, color=None):
+        """
+            The legal moves as packed ints (see base.packMove), generated 
+            from the move tables without creating Move objects.
+        """
+        if color is None:
+            color = self.currentColor
+        rowNum, colNum = self.size
+        board = self.board
+        colorBits = CODE_SECOND if color == BLACK else 0
+        kingSafety = color == self.currentColor
+        checks = pins = None
+        if self.isChecked():
+            checks, pins = self.checkInfo()
+
+        codes = []
+        for pos in board:
+            piece = board[pos]
+            if piece.color != color:
+                continue
+            pieceType = type(piece)
+            base = START_CODE[pos] | PIECE_ID[pieceType] << CODE_TYPE_SHIFT | colorBits
+            for end in attackReach(piece, pos, board):
+                target = board.get(end)
+                if not (target is None) and target.color == color:
+                    continue
+                code = base | END_CODE[end]
+                if not (target is None):
+                    code |= CODE_CAPTURE
+                if pieceType == King:
+                    if not kingSafety or not self.isAttacked(end, guard=True):
+                        codes.append(code)
+                elif checks is None or isEvasion(pos, end, checks, pins):
+                    codes.append(code)
+                    codes.append(code | CODE_PROMOTE)
+
+        squares = [(x,y) for y in range(rowNum) for x in range(colNum)
+                   if (x,y) not in board]
+        if not (checks is None):
+            targets = evasionSquares(checks)
+            squares = [pos for pos in squares if pos in targets]
+        empty = [END_CODE[pos] for pos in squares]
+        for pieceType in handTypes(self.captured[self.currentColor]):
+            pieceId = PIECE_ID[pieceType]
+            base = packMove(pieceId, (0,0), pieceId, self.currentColor == BLACK, BOARD_SIZE, drop=True)
+            for end in empty:
+                codes.append(base | end)
+        return codes
+
+    def encodeMove(self, move):
+        return move.code()
+
+    def decodeMove(self, code):
+        return decodeMove(code)
+
     def isValid(self, move):
-        return move in self.legalMoves()
+        key = move.code() & CODE_KEY_MASK
+        return key in {code & CODE_KEY_MASK for code in self.legalMoveCodes()}
+
+    def kingSquare(self, color=None):
+        if color is None:
+            color = self.currentColor
+        self.attackMaps()
+
+        kings = self._kings[color]
+        if not kings:
+            return None
+        if len(kings) == 1:
+            return kings[0]
+        for pos in self.board:
+            if pos in kings:
+                return pos
 
     def isChecked(self):
-    	for pos in self.board:
-    		piece = self.board[pos]
-    		if type(piece) == King and piece.color == self.currentColor:
-    			return self.isAttacked(pos)
-    	return False
+        pos = self.kingSquare()
+        if pos is None:
+            return False
+        return self.isAttacked(pos)
 
     def checkedBy(self):
-        for pos in self.board:
-            piece = self.board[pos]
-            if type(piece) == King and piece.color == self.currentColor:
-                return self.attackedBy(pos)
-        return False
+        pos = self.kingSquare()
+        if pos is None:
+            return False
+        return self.attackedBy(pos)
 
     def isCheckmate(self):
-        return (self.isChecked() and not self.legalMoves())
+        return (self.isChecked() and not self.hasLegalMove())
 
     def otherColor(self,color=None):
         if color == WHITE:
@@ -456,41 +805,105 @@ class kyotoShogiGame():
             if not self.isValid(move):
                 return False
 
+        self.push(move)
+        return True
+
+    def push(self, move):
+        """
+            Play a move in place without validating it. The moved piece and 
+            the piece it replaced are kept on the undo stack, so that pop() 
+            can restore promotions and captures exactly.
+        """
         start = move.start 
         end = move.end
 
         if not move.drop:
             piece = self.board.pop(start)
+            taken = self.board.get(end)
             if move.capture:
-                captured = self.board[end].original
-                self.captured[self.currentColor].append(
-                        captured(self.currentColor, captured))
+                captured = taken.original
+                hand = self.captured[self.currentColor]
+                hand[captured] = hand.get(captured, 0) + 1
 
+            moved = piece
             if move.promote:
                 pieceType = type(piece)
                 promoted = PIECE_PROMOTE[pieceType]
-                piece = promoted(piece.color, pieceType)
+                moved = promoted(piece.color, pieceType)
 
-            self.board[end] = piece
+            self.board[end] = moved
         else:
-            piece = self.captured[self.currentColor].pop(start)
+            pieceType = type(move.piece)
+            hand = self.captured[self.currentColor]
+            if hand[pieceType] == 1:
+                del hand[pieceType]
+            else:
+                hand[pieceType] -= 1
+            piece = pieceType(self.currentColor, pieceType)
+            taken = None
             self.board[end] = piece
+        self.history.append((move, piece, taken))
+        if not (self._hash is None):
+            self._hash ^= self._hashDelta(move, piece, taken, self.board[end], self.currentColor)
         self.currentColor = self.otherColor(self.currentColor)
-        return True
+        if self._attackBoard is self.board:
+            self._updateAttacks([end] if move.drop else [start, end])
+
+    def pop(self):
+        """
+            Undo the last pushed move and return it.
+        """
+        move, piece, taken = self.history.pop()
+        color = self.otherColor(self.currentColor)
+        end = move.end
+
+        if not (self._hash is None):
+            self._hash ^= self._hashDelta(move, piece, taken, self.board[end], color)
+        del self.board[end]
+        if not move.drop:
+            self.board[move.start] = piece
+            if not (taken is None):
+                self.board[end] = taken
+            if move.capture:
+                hand = self.captured[color]
+                captured = taken.original
+                if hand[captured] == 1:
+                    del hand[captured]
+                else:
+                    hand[captured] -= 1
+        else:
+            hand = self.captured[color]
+            hand[type(piece)] = hand.get(type(piece), 0) + 1
+        self.currentColor = color
+        if self._attackBoard is self.board:
+            self._updateAttacks([end] if move.drop else [move.start, end])
+        return move
+
+    def copy(self):
+        game = copy.copy(self)
+        game.board = dict(self.board)
+        game.captured = {color: dict(hand) for color, hand in self.captured.items()}
+        game.history = list(self.history)
+        game.refresh()
+        game._hash = self._hash
+        return game
 
     def peek(self, move, moveCheck = True):
-        game = copy.deepcopy(self)
-        if not game.play(move, moveCheck):
-            return None
+        if moveCheck:
+            if not self.isValid(move):
+                return None
+
+        game = self.copy()
+        game.push(move)
         return game
 
     def winner(self):
         rowNum, colNum = self.size
 
-        if not self.legalMoves():
+        if not self.hasLegalMove():
             return self.otherColor(self.currentColor)
 
         return None
 
     def loser(self):
-        self.otherColor(self.winner())
\ No newline at end of file
+        return self.otherColor(self.winner())
\ No newline at end of file
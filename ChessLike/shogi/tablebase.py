@@ -0,0 +1,273 @@
+"""
+    Endgame tablebases for Kyoto shogi.
+
+    Pieces never leave a Kyoto shogi game: a captured piece goes to the
+    capturer's hand and every move may flip a piece to its PIECE_PROMOTE
+    partner. A material class (two kings and some promotion pairs, e.g.
+    Silver/Bishop) is therefore closed under moves, and all its positions
+    can be enumerated: every piece with an owner, a square or the hand, its
+    current type and its original type. Every position is expanded once
+    with the game's own move generator, and the results are found by
+    retrograde analysis over the resulting move graph, as in
+    HexapawnSolver.
+
+    python -m ChessLike.shogi.tablebase 3 kyoto3.ctb
+"""
+import argparse
+import itertools
+import os
+import time
+from array import array
+from collections import deque
+
+from .kyotoShogi import kyotoShogiGame, King, PIECE_PROMOTE, PIECE_SYMBOL, WHITE, BLACK
+from ..mmaptable import MappedTable, writeTable
+
+VALUE_FORMAT = "<H"
+UNKNOWN = 0xFFFF
+WIN_FLAG = 0x8000
+
+PAIRS = []
+for pieceType, partner in PIECE_PROMOTE.items():
+    if not (partner is None) and (partner, pieceType) not in PAIRS:
+        PAIRS.append((pieceType, partner))
+
+def materialClasses(maxPieces):
+    """
+        Material classes with at most maxPieces pieces, as tuples of
+        promotion pairs besides the two kings. Each pair occurs at most
+        twice, as in the initial position.
+    """
+    classes = []
+    for pieceNum in range(max(maxPieces-2, 0)+1):
+        for pairs in itertools.combinations_with_replacement(PAIRS, pieceNum):
+            if all(pairs.count(pair) <= 2 for pair in pairs):
+                classes.append(pairs)
+    return classes
+
+def className(pairs):
+    return "KK" + "".join(PIECE_SYMBOL[pair[0]] + PIECE_SYMBOL[pair[1]] for pair in pairs)
+
+def pieceStates(pair, squares):
+    """
+        Every (square or None for the hand, piece) a piece of a promotion
+        pair (or of the King, pair == (King,)) can be in, for both owners.
+        Pieces in hand always have their own type as original.
+    """
+    states = []
+    for color in [WHITE, BLACK]:
+        for pieceType in pair:
+            states.append((None, pieceType(color, pieceType)))
+            for pos in squares:
+                for original in set(pair):
+                    states.append((pos, pieceType(color, original)))
+    return states
+
+def enumeratePositions(pairs, size):
+    """
+        Yield (board, hands) for every placement of two kings and pairs,
+        hands mapping piece types to counts. Identical pieces are placed in
+        nondecreasing state order, so that each position is produced once.
+    """
+    rowNum, colNum = size
+    squares = [(x,y) for y in range(rowNum) for x in range(colNum)]
+    groups = [(King,), (King,)] + sorted(pairs, key=lambda pair: PAIRS.index(pair))
+    stateLists = [pieceStates(group, squares) for group in groups]
+
+    def place(index, minState, board, hands):
+        if index == len(groups):
+            yield board, hands
+            return
+        start = minState if index > 0 and groups[index] == groups[index-1] else 0
+        for stateIndex in range(start, len(stateLists[index])):
+            pos, piece = stateLists[index][stateIndex]
+            if pos is None:
+                hand = hands[piece.color]
+                pieceType = type(piece)
+                hand[pieceType] = hand.get(pieceType, 0) + 1
+                yield from place(index+1, stateIndex, board, hands)
+                hand[pieceType] -= 1
+                if hand[pieceType] == 0:
+                    del hand[pieceType]
+            elif pos not in board:
+                board[pos] = piece
+                yield from place(index+1, stateIndex, board, hands)
+                del board[pos]
+
+    yield from place(0, 0, {}, {WHITE: {}, BLACK: {}})
+
+def solveClass(pairs, gameType=kyotoShogiGame):
+    """
+        (key, value) of every position of a material class, keyed by the
+        position hash. value has WIN_FLAG set when the side to move wins and
+        the distance to the end of the game in plies in the low bits;
+        UNKNOWN marks a draw (neither side can force a win).
+    """
+    game = gameType()
+    keys = array("Q")
+    index = {}
+    childStart = array("L", [0])
+    children = array("Q")
+
+    for board, hands in enumeratePositions(pairs, game.size):
+        for color in [WHITE, BLACK]:
+            game.board = dict(board)
+            game.captured = {WHITE: dict(hands[WHITE]), BLACK: dict(hands[BLACK])}
+            game.currentColor = color
+            game.history = []
+            game.refresh()
+            key = game.hash()
+            if key in index:
+                continue
+            index[key] = len(keys)
+            keys.append(key)
+            for code in game.legalMoveCodes():
+                game.push(game.decodeMove(code))
+                children.append(game.hash())
+                game.pop()
+            childStart.append(len(children))
+
+    size = len(keys)
+    childIndex = array("L", [index[key] for key in children])
+    del children
+
+    parentCount = array("L", [0]) * (size+1)
+    for child in childIndex:
+        parentCount[child+1] += 1
+    for i in range(size):
+        parentCount[i+1] += parentCount[i]
+    parentStart = parentCount
+    fill = array("L", parentStart)
+    parents = array("L", [0]) * len(childIndex)
+    for parent in range(size):
+        for child in childIndex[childStart[parent]:childStart[parent+1]]:
+            parents[fill[child]] = parent
+            fill[child] += 1
+
+    table = array("H", [UNKNOWN]) * size
+    remaining = array("L", [0]) * size
+    queue = deque()
+    for i in range(size):
+        moveNum = childStart[i+1] - childStart[i]
+        if moveNum == 0:
+            table[i] = 0
+            queue.append(i)
+        else:
+            remaining[i] = moveNum
+
+    while queue:
+        i = queue.popleft()
+        value = table[i]
+        distance = (value & ~WIN_FLAG) + 1
+        for parent in parents[parentStart[i]:parentStart[i+1]]:
+            if table[parent] != UNKNOWN:
+                continue
+            if not (value & WIN_FLAG):
+                table[parent] = WIN_FLAG | distance
+                queue.append(parent)
+            else:
+                remaining[parent] -= 1
+                if remaining[parent] == 0:
+                    table[parent] = distance
+                    queue.append(parent)
+
+    return [(keys[i], (table[i],)) for i in range(size)]
+
+def generate(path, maxPieces=3, log=None):
+    """
+        Solve every material class with at most maxPieces pieces and write
+        one table file to path.
+    """
+    records = []
+    for pairs in materialClasses(maxPieces):
+        start = time.perf_counter()
+        solved = solveClass(pairs)
+        records += solved
+        if not (log is None):
+            log("{}: {} positions in {:.1f}s".format(
+                    className(pairs), len(solved), time.perf_counter()-start))
+    return writeTable(path, records, VALUE_FORMAT, {"maxPieces": maxPieces})
+
+def pieceCount(game):
+    return (len(game.board) + sum(game.captured[WHITE].values())
+            + sum(game.captured[BLACK].values()))
+
+class KyotoTablebase():
+    """
+        A generated table opened through mmap. probe(game) returns
+        (result, distance) for the side to move, result being 1 (win), -1
+        (loss) or 0 (draw, distance None), or None when the position is not
+        in the table.
+    """
+    def __init__(self, path):
+        self.table = MappedTable(path)
+        self.maxPieces = self.table.meta["maxPieces"]
+
+    def probe(self, game):
+        if pieceCount(game) > self.maxPieces:
+            return None
+        value = self.table.get(game.hash())
+        if value is None:
+            return None
+        value = value[0]
+        if value == UNKNOWN:
+            return (0, None)
+        if value & WIN_FLAG:
+            return (1, value & ~WIN_FLAG)
+        return (-1, value)
+
+    def bestMove(self, game):
+        """
+            The fastest winning move, a drawing move, or the slowest losing
+            move; None if the position is not in the table.
+        """
+        if self.probe(game) is None:
+            return None
+        best = None
+        bestRank = None
+        for move in game.legalMoves():
+            game.push(move)
+            result, distance = self.probe(game)
+            game.pop()
+            if result == -1:
+                rank = (0, distance)
+            elif result == 0:
+                rank = (1, 0)
+            else:
+                rank = (2, -distance)
+            if best is None or rank < bestRank:
+                best, bestRank = move, rank
+        return best
+
+    def close(self):
+        self.table.close()
+
+TABLEBASES = []
+
+def loadTablebase(path):
+    TABLEBASES.append(KyotoTablebase(path))
+
+def probe(game):
+    """
+        Probe hook for search: the first loaded tablebase containing game.
+    """
+    if not isinstance(game, kyotoShogiGame):
+        return None
+    for tablebase in TABLEBASES:
+        result = tablebase.probe(game)
+        if not (result is None):
+            return result
+    return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ChessLike.shogi.tablebase")
+    parser.add_argument("pieces", type=int, help="largest number of pieces")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    count = generate(args.path, args.pieces, log=print)
+    print("{} positions, {} bytes".format(count, os.path.getsize(args.path)))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
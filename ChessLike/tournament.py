@@ -0,0 +1,209 @@
+"""
+    Self-play and tournament runner.
+
+    python -m ChessLike.tournament hexapawn:4x4 randomMove minOpponents --games 200
+"""
+import argparse
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import player
+from .search import searchMove
+from .chess.solver import perfectMove
+from .chess.nPawn import nPawnGame, WHITE
+from .variants import makeGame, parseVariant
+from .records import GameRecord, RecordWriter
+
+PLAYERS = {"randomMove"  : player.randomMove,
+           "minOpponents": player.minOpponents,
+           "searchMove"  : searchMove,
+           "perfectMove" : perfectMove}
+
+# Players that only play one game type; the others play every variant
+PLAYER_GAMES = {"perfectMove": nPawnGame}
+
+class GameResult():
+    def __init__(self, index, white, black, winner, plies, moves, seconds, seed):
+        self.index = index
+        self.white = white
+        self.black = black
+        self.winner = winner
+        self.plies = plies
+        self.moves = moves
+        self.seconds = seconds
+        self.seed = seed
+
+    def winnerName(self):
+        if self.winner is None:
+            return None
+        return self.white if self.winner == WHITE else self.black
+
+    def __repr__(self):
+        return "GameResult({}: {} vs {}, winner={}, plies={})".format(
+                self.index, self.white, self.black, self.winnerName(), self.plies)
+
+def playerName(p):
+    if isinstance(p, tuple):
+        return p[0]
+    return getattr(p, "__name__", repr(p))
+
+def playerFunction(p):
+    if isinstance(p, tuple):
+        return p[1]
+    return p
+
+def playGame(variant, white, black, seed=None, maxPlies=200, index=0):
+    """
+        Play one game between two players given as callables or (name,
+        callable) pairs. The random module is seeded with seed first, so a
+        game can be replayed exactly. A player returning an illegal move
+        loses; a game reaching maxPlies is a draw.
+    """
+    random.seed(seed)
+    game = makeGame(variant)
+    players = {game.currentColor: playerFunction(white),
+               game.otherColor(game.currentColor): playerFunction(black)}
+
+    start = time.perf_counter()
+    moves = []
+    winner = game.winner()
+    while winner is None and len(moves) < maxPlies:
+        move = players[game.currentColor](game)
+        if move is None or not game.play(move):
+            winner = game.otherColor(game.currentColor)
+            break
+        moves.append(str(move))
+        winner = game.winner()
+
+    return GameResult(index, playerName(white), playerName(black), winner,
+                      len(moves), moves, time.perf_counter()-start, seed)
+
+def schedule(pairings, games, alternate=True, seed=0):
+    """
+        List of (index, white, black, seed) with games games per pairing,
+        swapping colors every other game if alternate is set.
+    """
+    tasks = []
+    for first, second in pairings:
+        for n in range(games):
+            if alternate and n % 2 == 1:
+                white, black = second, first
+            else:
+                white, black = first, second
+            index = len(tasks)
+            tasks.append((index, white, black, seed + index))
+    return tasks
+
+def runTournament(variant, pairings, games=100, workers=None, maxPlies=200,
+                  seed=0, alternate=True):
+    """
+        Play games games for every pairing across a process pool and yield
+        each GameResult as soon as it finishes. Players must be picklable,
+        i.e. defined at module level.
+    """
+    tasks = schedule(pairings, games, alternate, seed)
+    if workers == 1:
+        for index, white, black, gameSeed in tasks:
+            yield playGame(variant, white, black, gameSeed, maxPlies, index)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(playGame, variant, white, black, gameSeed, maxPlies, index)
+                   for index, white, black, gameSeed in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+def wilson(successes, trials, z=1.96):
+    """
+        Wilson score interval of a binomial proportion.
+    """
+    if trials == 0:
+        return (0.0, 1.0)
+    p = successes / trials
+    denominator = 1 + z*z/trials
+    center = (p + z*z/(2*trials)) / denominator
+    margin = z * math.sqrt(p*(1-p)/trials + z*z/(4*trials*trials)) / denominator
+    return (max(0.0, center-margin), min(1.0, center+margin))
+
+def summarize(results):
+    """
+        Per player totals: games, wins, losses, draws, score (draws count
+        half) and the 95% confidence interval of the score.
+    """
+    table = {}
+    for result in results:
+        for name in [result.white, result.black]:
+            table.setdefault(name, {"games": 0, "wins": 0, "losses": 0, "draws": 0})
+            table[name]["games"] += 1
+        winnerName = result.winnerName()
+        if winnerName is None:
+            table[result.white]["draws"] += 1
+            table[result.black]["draws"] += 1
+        elif result.white == result.black:
+            table[winnerName]["wins"] += 1
+            table[winnerName]["losses"] += 1
+        else:
+            loserName = result.black if winnerName == result.white else result.white
+            table[winnerName]["wins"] += 1
+            table[loserName]["losses"] += 1
+
+    for name, row in table.items():
+        points = row["wins"] + row["draws"]/2
+        row["score"] = points / row["games"]
+        row["interval"] = wilson(points, row["games"])
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ChessLike.tournament")
+    parser.add_argument("variant")
+    parser.add_argument("players", nargs="+", choices=sorted(PLAYERS),
+                        help="every pair of the listed players meets")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--record", default=None,
+                        help="append the games to this binary record file")
+    args = parser.parse_args(argv)
+    try:
+        gameType, _ = parseVariant(args.variant)
+    except ValueError as error:
+        parser.error(str(error))
+    for name in args.players:
+        if name in PLAYER_GAMES and not (PLAYER_GAMES[name] is gameType):
+            parser.error("{} cannot play {}".format(name, args.variant))
+
+    names = args.players
+    if len(names) == 1:
+        pairings = [(names[0], names[0])]
+    else:
+        pairings = [(a, b) for i, a in enumerate(names) for b in names[i+1:]]
+    pairings = [((a, PLAYERS[a]), (b, PLAYERS[b])) for a, b in pairings]
+
+    start = time.perf_counter()
+    results = []
+    writer = None if args.record is None else RecordWriter(args.record)
+    for result in runTournament(args.variant, pairings, args.games, args.workers,
+                                args.max_plies, args.seed):
+        results.append(result)
+        if args.verbose:
+            print(result, " ".join(result.moves))
+        if not (writer is None):
+            writer.write(GameRecord.fromNotation(args.variant, result.moves, result.winner))
+    if not (writer is None):
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    for name, row in sorted(summarize(results).items()):
+        low, high = row["interval"]
+        print("{:14s} {:6d} games {:6d} W {:6d} L {:6d} D  score {:.3f} [{:.3f}, {:.3f}]".format(
+                name, row["games"], row["wins"], row["losses"], row["draws"],
+                row["score"], low, high))
+    print("{} games in {:.2f}s".format(len(results), elapsed))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,37 @@
+from .chess.nPawn import nPawnGame
+from .shogi.kyotoShogi import kyotoShogiGame
+from .shogi.bitboard import BitboardKyotoShogi
+
+VARIANTS = {"hexapawn"      : nPawnGame,
+            "kyoto"         : kyotoShogiGame,
+            "kyoto-bitboard": BitboardKyotoShogi}
+
+def parseVariant(name):
+    """
+        Split a variant name such as "kyoto" or "hexapawn:4x5" (rows x 
+        columns) into the game class and its board size.
+    """
+    variant, _, size = name.partition(":")
+    if variant not in VARIANTS:
+        raise ValueError("Unknown variant: {}".format(name))
+    if size:
+        rowNum, _, colNum = size.partition("x")
+        size = (int(rowNum), int(colNum or rowNum))
+    else:
+        size = None
+    return VARIANTS[variant], size
+
+def makeGame(name):
+    gameType, size = parseVariant(name)
+    if gameType is nPawnGame:
+        return gameType(size)
+    return gameType()
+
+def variantName(game):
+    for variant, gameType in VARIANTS.items():
+        if type(game) is gameType:
+            if isinstance(game, nPawnGame):
+                rowNum, colNum = game.size
+                return "{}:{}x{}".format(variant, rowNum, colNum)
+            return variant
+    raise ValueError("Unknown game type: {}".format(type(game).__name__))
@@ -0,0 +1,16 @@
+import hashlib
+
+class ZobristTable(dict):
+    """
+        64-bit keys for Zobrist hashing, created on first use. 
+        Keys are derived from the item itself rather than drawn in order 
+        from a random generator, so every process (and every file written 
+        with them) agrees on the same key for the same item.
+    """
+    def __missing__(self, item):
+        digest = hashlib.blake2b(repr(item).encode(), digest_size=8).digest()
+        key = int.from_bytes(digest, "little")
+        self[item] = key
+        return key
+
+ZOBRIST = ZobristTable()